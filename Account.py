@@ -0,0 +1,56 @@
+class Account:
+    """
+    A compact bank account record using slots instead of a per-account dict
+    Supports dict style field access so it can be used wherever account dicts are
+
+    Accounts read from a master file keep their record's offset in the text read, and the text itself
+    so writers can copy the record instead of formatting it. Assigning any field drops the text, and
+    accounts not read from a master have an offset of -1.
+    """
+
+    FIELDS = ('account_number', 'name', 'status', 'balance', 'total_transactions', 'plan')
+
+    __slots__ = FIELDS + ('source', 'offset')
+
+    def __init__(self, account_number, name, status, balance, total_transactions, plan, source=None, offset=-1):
+        # Slots are set past __setattr__, so a new account keeps its record
+        set_slot = object.__setattr__
+        set_slot(self, 'account_number', account_number)
+        set_slot(self, 'name', name)
+        set_slot(self, 'status', status)
+        set_slot(self, 'balance', balance)
+        set_slot(self, 'total_transactions', total_transactions)
+        set_slot(self, 'plan', plan)
+        set_slot(self, 'source', source)
+        set_slot(self, 'offset', offset)
+
+    def __setattr__(self, name, value):
+        # A changed field no longer matches the master record
+        object.__setattr__(self, name, value)
+        if name in Account.FIELDS:
+            object.__setattr__(self, 'source', None)
+
+    # Field reads go straight to the slot descriptors without a Python level call
+    __getitem__ = object.__getattribute__
+    __setitem__ = __setattr__
+
+    def __eq__(self, other):
+        if isinstance(other, (Account, dict)):
+            return all(self[field] == other[field] for field in Account.FIELDS)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __reduce__(self):
+        # Pickle as a plain tuple of fields, which keeps shards and spilled runs small
+        # Master records are not pickled, so unpickled accounts are always formatted
+        return (Account, tuple(self[field] for field in Account.FIELDS))
+
+    def __repr__(self):
+        return f"Account({', '.join(repr(self[field]) for field in Account.FIELDS)})"
+
+    def to_dict(self):
+        """
+        Returns account as a plain account dict
+        """
+        return {field: self[field] for field in Account.FIELDS}
@@ -0,0 +1,234 @@
+from bisect import bisect_left, insort
+import heapq
+
+class AccountStore:
+    """
+    An account collection indexed by account number
+    Behaves like the plain accounts list but supports constant time lookups and deletes
+    A secondary index from normalised holder name to account numbers and an ordered index of
+    account numbers in master file order are built on first use and then kept up to date
+    """
+
+    # Share of slots that may hold tombstones before a removal compacts the store
+    COMPACT_SHARE = 0.5
+
+    def __init__(self, accounts=()):
+        self._slots = []
+        self._index = {}
+        self._duplicates = set()
+        self._tombstones = 0
+        self._names = None
+        self._order = None
+        self._key = None
+        for account in accounts:
+            self.append(account)
+
+    def __iter__(self):
+        # Deleted accounts leave a None tombstone until the store is compacted
+        if not self._tombstones:
+            return iter(self._slots)
+        return (account for account in self._slots if account is not None)
+
+    def __len__(self):
+        return len(self._slots) - self._tombstones
+
+    def __contains__(self, account):
+        return account is not None and account in self._slots
+
+    def get(self, account_number):
+        """
+        Returns first account with given account number or None if it does not exist
+        """
+        position = self._index.get(account_number)
+        if position is None:
+            return None
+        return self._slots[position]
+
+    def append(self, account):
+        """
+        Adds account to the end of the store and indexes it
+        """
+        self._slots.append(account)
+        if self._names is not None:
+            self._add_name(account)
+        if account['account_number'] in self._index:
+            # Lookups must keep returning the first match like a list scan would
+            self._duplicates.add(account['account_number'])
+        else:
+            self._index[account['account_number']] = len(self._slots) - 1
+            if self._order is not None:
+                insort(self._order, (self._key(account['account_number']), account['account_number']))
+
+    def remove(self, account):
+        """
+        Removes account from the store by leaving a tombstone in its slot
+        The store is compacted once tombstones exceed COMPACT_SHARE of its slots
+        Raises ValueError if account is not in the store
+        """
+        number = account['account_number']
+        position = self._index.get(number)
+        if position is None or (self._slots[position] is not account and self._slots[position] != account):
+            if number not in self._duplicates:
+                raise ValueError("AccountStore.remove(x): x not in store")
+            position = self._find(account)
+
+        self._slots[position] = None
+        self._tombstones += 1
+        if self._names is not None:
+            self._remove_name(account)
+        if self._index.get(number) == position:
+            del self._index[number]
+            if number in self._duplicates:
+                self._reindex(number)
+            if self._order is not None and number not in self._index:
+                del self._order[bisect_left(self._order, (self._key(number), number))]
+
+        if self._tombstones > len(self._slots) * AccountStore.COMPACT_SHARE:
+            self.compact()
+
+    def ordered(self):
+        """
+        Yields accounts in master file order of account number, repeated numbers in store order
+        """
+        order = self._ordered_index()
+        slots = self._slots
+        index = self._index
+        duplicates = self._duplicates
+        for _, number in order:
+            if number in duplicates:
+                yield from self._accounts_of(number)
+            else:
+                yield slots[index[number]]
+
+    def range(self, low, high):
+        """
+        Returns accounts with account numbers from low to high inclusive, in master file order
+        """
+        order = self._ordered_index()
+        start = bisect_left(order, (self._key(low),))
+        stop = bisect_left(order, (self._key(high) + 1,))
+        return [account for _, number in order[start:stop] for account in self._accounts_of(number)]
+
+    def top_balances(self, n):
+        """
+        Returns up to n accounts with the highest balances, highest first and ties in master file order
+        """
+        return heapq.nlargest(n, self.ordered(), key=lambda account: account['balance'])
+
+    def holders(self, name):
+        """
+        Returns account numbers of accounts held by given name, compared normalised, in store order
+        """
+        return list(self._name_index().get(AccountStore.normalize_name(name), ()))
+
+    def is_holder(self, account_number, name):
+        """
+        Returns whether an account with given account number is held by given name, compared normalised
+        """
+        return account_number in self._name_index().get(AccountStore.normalize_name(name), ())
+
+    @staticmethod
+    def normalize_name(name):
+        """
+        Returns holder name with case and runs of whitespace normalised
+        """
+        return ' '.join(name.split()).casefold()
+
+    def compact(self):
+        """
+        Drops tombstones left by deleted accounts and rebuilds the index
+        """
+        if not self._tombstones:
+            return
+        self._rebuild([account for account in self._slots if account is not None])
+
+    def _rebuild(self, accounts):
+        """
+        Replaces store contents with given tombstone free account list
+        """
+        self._slots = accounts
+        self._tombstones = 0
+        self._names = None
+        self._order = None
+        self._index = {}
+        self._duplicates = set()
+        for position, account in enumerate(accounts):
+            if account['account_number'] in self._index:
+                self._duplicates.add(account['account_number'])
+            else:
+                self._index[account['account_number']] = position
+
+    def _name_index(self):
+        """
+        Returns name index, building it from the current accounts on first use
+        """
+        if self._names is None:
+            self._names = {}
+            for account in self:
+                self._add_name(account)
+        return self._names
+
+    def _ordered_index(self):
+        """
+        Returns sorted (key, account number) pairs of distinct account numbers, building them on first use
+        Building is linear when accounts are already in master file order, as read from a master file
+        """
+        if self._order is None:
+            # Imported here as Toolbox itself depends on AccountStore
+            from Toolbox import Toolbox
+            self._key = Toolbox.account_key
+            self._order = sorted(zip(map(self._key, self._index), self._index))
+        return self._order
+
+    def _accounts_of(self, number):
+        """
+        Returns accounts with given account number in store order
+        """
+        if number not in self._duplicates:
+            return (self._slots[self._index[number]],)
+        return [slot for slot in self._slots if slot is not None and slot['account_number'] == number]
+
+    def _add_name(self, account):
+        """
+        Counts account under its holder's normalised name
+        """
+        numbers = self._names.setdefault(AccountStore.normalize_name(account['name']), {})
+        numbers[account['account_number']] = numbers.get(account['account_number'], 0) + 1
+
+    def _remove_name(self, account):
+        """
+        Uncounts account from its holder's normalised name
+        """
+        name = AccountStore.normalize_name(account['name'])
+        numbers = self._names[name]
+        numbers[account['account_number']] -= 1
+        if not numbers[account['account_number']]:
+            del numbers[account['account_number']]
+            if not numbers:
+                del self._names[name]
+
+    def _find(self, account):
+        """
+        Returns slot position of given account, preferring the same object over an equal one
+        """
+        number = account['account_number']
+        matches = [position for position, slot in enumerate(self._slots)
+                   if slot is not None and slot['account_number'] == number]
+        for position in matches:
+            if self._slots[position] is account:
+                return position
+        for position in matches:
+            if self._slots[position] == account:
+                return position
+        raise ValueError("AccountStore.remove(x): x not in store")
+
+    def _reindex(self, number):
+        """
+        Points index at the first remaining account with given account number
+        """
+        matches = [position for position, slot in enumerate(self._slots)
+                   if slot is not None and slot['account_number'] == number]
+        if matches:
+            self._index[number] = matches[0]
+        if len(matches) < 2:
+            self._duplicates.discard(number)
@@ -0,0 +1,221 @@
+import argparse
+import asyncio
+import os
+import sys
+
+from AccountStore import AccountStore
+from CentsTransactionHandler import CentsTransactionHandler
+from ErrorSink import CollectingSink, ErrorSink
+from FileIO import FileIO
+from TransactionHandler import TransactionHandler
+
+class BackEndService:
+    """
+    Long running back end applying transaction records received over a local Unix socket
+    Account state is kept in memory. Records are appended to a journal in merged transaction log format,
+    so the journal can be committed by BackEndSystem like any daily log.
+
+    Clients send one transaction record per line and receive one reply line per record, in order:
+    OK, or the errors the record raised. Replies are only sent once the record's journal write is
+    on disk. Journal writes are grouped until commit_size records are pending or commit_interval
+    seconds have passed. The current accounts file is rewritten at most every accounts_interval seconds.
+    """
+
+    def __init__(self, master_path, journal_path, curr_acc_path, socket_path, commit_interval=0.005,
+                 commit_size=4096, accounts_interval=1.0, cents=False):
+        self.master_path = master_path
+        self.journal_path = journal_path
+        self.curr_acc_path = curr_acc_path
+        self.socket_path = socket_path
+        self.commit_interval = commit_interval
+        self.commit_size = commit_size
+        self.accounts_interval = accounts_interval
+        self.cents = cents
+        self.handler = CentsTransactionHandler if cents else TransactionHandler
+
+        self.accounts = None
+        self.line_num = 0
+        self._journal = None
+        self._server = None
+        self._sink = CollectingSink()
+        self._pending = []
+        self._batch = None
+        self._timer = None
+        self._accounts_dirty = False
+        self._accounts_timer = None
+
+    async def start(self):
+        """
+        Loads account state, replays the journal left by an earlier run and starts listening
+        """
+        self.accounts = AccountStore(FileIO.read_old_bank_accounts_mapped(self.master_path, self.cents))
+        if os.path.exists(self.journal_path):
+            # A record torn by a crash was never replied to, so it is dropped before new records follow it
+            self.line_num = FileIO.truncate_torn_line(self.journal_path)
+            # Errors of journaled records were replied to by the earlier run
+            with ErrorSink():
+                self.handler.apply(self.accounts, FileIO.iter_transactions(self.journal_path, cents=self.cents))
+
+        self._journal = open(self.journal_path, 'a')
+        self._batch = asyncio.get_running_loop().create_future()
+        self._write_accounts()
+        self._server = await asyncio.start_unix_server(self._handle, self.socket_path)
+
+    async def stop(self):
+        """
+        Stops listening, commits pending records and writes the current accounts file
+        """
+        self._server.close()
+        await self._server.wait_closed()
+        self._commit()
+        if self._accounts_timer is not None:
+            self._accounts_timer.cancel()
+        self._write_accounts()
+        self._journal.close()
+
+    async def serve_forever(self):
+        """
+        Runs the service until cancelled
+        """
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.stop()
+
+    async def _handle(self, reader, writer):
+        """
+        Applies records received on one connection, queueing each reply behind its group commit
+        """
+        replies = asyncio.Queue()
+        sender = asyncio.create_task(self._send(replies, writer))
+        try:
+            while line := await reader.readline():
+                replies.put_nowait((self._batch, self._apply(line)))
+            replies.put_nowait(None)
+            await sender
+        except asyncio.CancelledError:
+            # The service is stopping, replies not sent yet are dropped with the connection
+            sender.cancel()
+        finally:
+            writer.close()
+
+    async def _send(self, replies, writer):
+        """
+        Writes replies in order once their batch has been committed
+        """
+        while (item := await replies.get()) is not None:
+            batch, reply = item
+            await batch
+            writer.write(reply)
+            if replies.empty():
+                await writer.drain()
+
+    def _apply(self, line):
+        """
+        Validates and applies one received record and adds it to the pending batch
+        Returns reply line for the record
+        """
+        clean_line = line.decode('ascii', 'replace').rstrip('\r\n')
+        self.line_num += 1
+        self._pending.append(clean_line + "\n")
+
+        with self._sink:
+            transaction = FileIO.parse_transaction(self.line_num, clean_line, self.cents)
+            if transaction is not None:
+                self.handler.apply(self.accounts, (transaction,))
+                self._accounts_dirty = True
+        records, self._sink.records = self._sink.records, []
+
+        if len(self._pending) >= self.commit_size:
+            self._commit()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.commit_interval, self._commit)
+
+        if not records:
+            return b"OK\n"
+        return ("; ".join(ErrorSink.format(record) for record in records) + "\n").encode('ascii', 'replace')
+
+    def _commit(self):
+        """
+        Writes pending records to the journal with a single flush to disk and releases their replies
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+
+        self._journal.write(''.join(self._pending))
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+        self._pending.clear()
+
+        batch, self._batch = self._batch, asyncio.get_running_loop().create_future()
+        batch.set_result(None)
+
+        if self._accounts_dirty and self._accounts_timer is None:
+            self._accounts_timer = asyncio.get_running_loop().call_later(self.accounts_interval,
+                                                                         self._write_accounts)
+
+    def _write_accounts(self):
+        """
+        Rewrites the current accounts file from the committed account state
+        Pending records are committed first, as the accounts already include them
+        """
+        self._commit()
+        self._accounts_timer = None
+        self._accounts_dirty = False
+        FileIO.write_new_current_accounts(self.accounts.ordered(), self.curr_acc_path, self.cents)
+
+    @staticmethod
+    def main(argv=None):
+        """
+        Command line entry point running the service until interrupted
+        """
+        parser = argparse.ArgumentParser(description="Serve the bank back end on a Unix socket")
+        parser.add_argument('master')
+        parser.add_argument('journal')
+        parser.add_argument('current_accounts')
+        parser.add_argument('socket')
+        parser.add_argument('--cents', action='store_true', help="keep balances as integer cents")
+        args = parser.parse_args(argv)
+
+        service = BackEndService(args.master, args.journal, args.current_accounts, args.socket, cents=args.cents)
+        try:
+            asyncio.run(service.serve_forever())
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+
+class BackEndClient:
+    """
+    Minimal client standing in for the front end, sending records and reading their replies
+    """
+
+    def __init__(self, socket_path):
+        self.socket_path = socket_path
+        self._reader = None
+        self._writer = None
+
+    async def __aenter__(self):
+        self._reader, self._writer = await asyncio.open_unix_connection(self.socket_path)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self._writer.close()
+        await self._writer.wait_closed()
+
+    async def submit(self, lines):
+        """
+        Sends transaction records without waiting between them
+        Returns reply line of each record, in order
+        """
+        lines = list(lines)
+        self._writer.write(''.join(line if line.endswith("\n") else line + "\n" for line in lines).encode('ascii'))
+        await self._writer.drain()
+        return [(await self._reader.readline()).decode('ascii').rstrip("\n") for _ in lines]
+
+if __name__ == "__main__":
+    sys.exit(BackEndService.main())
@@ -1,4 +1,13 @@
+import sys
+from itertools import islice
+
+from AccountStore import AccountStore
+from CentsTransactionHandler import CentsTransactionHandler
+from ErrorSink import ErrorSink, PrintSink
 from FileIO import FileIO
+from Journal import Journal
+from Metrics import Metrics
+from Toolbox import Toolbox
 from TransactionHandler import TransactionHandler
 
 # TODO: Constants may be passed through command line in future for testing purposes
@@ -13,19 +22,157 @@ class BackEndSystem:
     """
 
     @staticmethod
-    def commit_transactions(old_acc_path, new_acc_path, log_path, curr_acc_path):
+    def commit_transactions(old_acc_path, new_acc_path, log_path, curr_acc_path, processes=None, cents=False,
+                            snapshot=False):
         """
         Applies daily transactions to master account file and produces new account files
+        Transactions are applied across a pool of processes when processes is given
+        Balances are kept as integer cents from parse to write when cents is set
+        The old master is loaded from its binary snapshot when a valid one matches it, and a snapshot
+        of the new master is written beside it when snapshot is set
+        Phases are timed on the active Metrics collector, if any
+        """
+        # Transactions are parsed lazily while they are being applied, so apply time includes parsing
+        BackEndSystem._commit(old_acc_path, new_acc_path, FileIO.iter_transactions(log_path, cents=cents),
+                              curr_acc_path, processes, cents, snapshot)
+
+    @staticmethod
+    def commit_sessions(old_acc_path, new_acc_path, sessions, curr_acc_path, processes=None, cents=False,
+                        snapshot=False):
+        """
+        Applies the transactions of front end session files like commit_transactions applies the merged log
+        sessions are (sequence, file path) pairs, merged on the fly in sequence order without a merged file
         """
+        BackEndSystem._commit(old_acc_path, new_acc_path, FileIO.merge_sessions(sessions, cents=cents),
+                              curr_acc_path, processes, cents, snapshot)
+
+    @staticmethod
+    def _commit(old_acc_path, new_acc_path, transactions, curr_acc_path, processes, cents, snapshot):
+        """
+        Applies lazily parsed transactions to master account file and produces new account files
+        """
+        handler = CentsTransactionHandler if cents else TransactionHandler
+
         # Read files
-        accounts = FileIO.read_old_bank_accounts(old_acc_path)
-        transactions = FileIO.read_transactions(log_path)
+        with Metrics.phase('read_master'):
+            accounts = AccountStore(FileIO.load_old_bank_accounts(old_acc_path, cents))
+        Metrics.add_records('read_master', len(accounts))
 
         # Apply transactions to accounts
-        TransactionHandler.apply(accounts, transactions)
+        with Metrics.phase('apply'):
+            if processes:
+                accounts = handler.apply_parallel(accounts, transactions, processes)
+            else:
+                handler.apply(accounts, transactions)
 
         # Write files
-        FileIO.write_new_master_accounts(accounts, new_acc_path)
-        FileIO.write_new_current_accounts(accounts, curr_acc_path)
+        with Metrics.phase('write'):
+            FileIO.write_new_accounts(accounts, new_acc_path, curr_acc_path, cents)
+        Metrics.add_records('write', len(accounts))
+        if snapshot:
+            with Metrics.phase('write_snapshot'):
+                FileIO.write_snapshot(new_acc_path)
+
+    @staticmethod
+    def commit_transactions_streaming(old_acc_path, new_acc_path, log_path, curr_acc_path, memory_budget=100000,
+                                      cents=False):
+        """
+        Applies daily transactions with bounded memory by merge-joining the sorted log against the master file
+        Produces the same account files as commit_transactions, but the old master must be sorted
+        by account number as written by this system and errors are reported grouped by account
+        """
+        handler = CentsTransactionHandler if cents else TransactionHandler
+        transactions = FileIO.sort_transactions(log_path, memory_budget, cents)
+        accounts = FileIO.iter_old_bank_accounts(old_acc_path, cents)
+
+        FileIO.stream_new_accounts(handler.apply_sorted(accounts, transactions), new_acc_path, curr_acc_path, cents)
+
+    @staticmethod
+    def commit_transactions_catchup(old_acc_path, new_acc_path, log_paths, curr_acc_path, daily_paths=None,
+                                    cents=False):
+        """
+        Applies several days of transaction logs in order with a single read of the old master
+        Produces the same account files and errors as committing each day in turn. The master and current
+        accounts files of day i are also written to the pair daily_paths[i] when given, None skipping a day.
+        """
+        handler = CentsTransactionHandler if cents else TransactionHandler
+
+        accounts = AccountStore(FileIO.read_old_bank_accounts_mapped(old_acc_path, cents))
+        for day, log_path in enumerate(log_paths):
+            if day:
+                # Start each day from accounts as the previous day's master would be read back
+                accounts = AccountStore(FileIO.reload_accounts(accounts, cents))
+            handler.apply(accounts, FileIO.iter_transactions(log_path, cents=cents))
+
+            if daily_paths and daily_paths[day]:
+                master_path, current_path = daily_paths[day]
+                FileIO.write_new_accounts(accounts, master_path, current_path, cents)
+
+        FileIO.write_new_accounts(accounts, new_acc_path, curr_acc_path, cents)
+
+    @staticmethod
+    def commit_transactions_resumable(old_acc_path, new_acc_path, log_path, curr_acc_path, journal_path,
+                                      checkpoint_every=100000, journal_every=10000, cents=False):
+        """
+        Applies daily transactions like commit_transactions, journaling progress so an interrupted run can resume
+        Applied lines are journaled every journal_every transactions and accounts checkpointed every
+        checkpoint_every. Rerunning over the same inputs resumes from the last checkpoint without reporting
+        errors of journaled lines again. The journal is removed once both account files are written,
+        so the new master must not replace the old one.
+        """
+        handler = CentsTransactionHandler if cents else TransactionHandler
+        journal = Journal(journal_path, (old_acc_path, log_path), cents)
+        accounts, start_line, journaled = journal.recover()
+        if accounts is None:
+            accounts = FileIO.read_old_bank_accounts_mapped(old_acc_path, cents)
+        accounts = AccountStore(accounts)
+        journal.begin()
+
+        if journaled > start_line:
+            # Errors of journaled lines were already reported before the interruption
+            with ErrorSink(), Metrics.suspended():
+                handler.apply(accounts, FileIO.iter_transactions(log_path, cents=cents, start_line=start_line,
+                                                                 stop_line=journaled))
+            start_line = journaled
+
+        transactions = FileIO.iter_transactions(log_path, cents=cents, start_line=start_line)
+        unsaved = 0
+        while True:
+            batch = list(islice(transactions, journal_every))
+            if not batch:
+                break
+            handler.apply(accounts, batch)
+            line_num = batch[-1]['line_number']
+
+            # Errors must be written before the journal claims their lines
+            if Toolbox.error_sink is not None:
+                Toolbox.error_sink.flush(wait=True)
+            sys.stdout.flush()
+            journal.record(line_num)
+
+            unsaved += len(batch)
+            if unsaved >= checkpoint_every:
+                journal.checkpoint(accounts, line_num)
+                unsaved = 0
+
+        FileIO.write_new_accounts(accounts, new_acc_path, curr_acc_path, cents)
+        journal.complete()
+
+    @staticmethod
+    def commit_transactions_incremental(master_path, log_path, curr_acc_path, compact_ratio=0.25, cents=False):
+        """
+        Applies daily transactions and updates the master account file in place
+        Only records of changed accounts are rewritten, so master file I/O scales with the day's changes.
+        Appended and tombstoned records leave the master unsorted until it is compacted.
+        """
+        handler = CentsTransactionHandler if cents else TransactionHandler
+
+        accounts = AccountStore(FileIO.read_old_bank_accounts_mapped(master_path, cents))
+        handler.apply(accounts, FileIO.iter_transactions(log_path, cents=cents))
+
+        FileIO.update_master_accounts(accounts, master_path, compact_ratio, cents)
+        FileIO.write_new_current_accounts(accounts.ordered(), curr_acc_path, cents)
 
-BackEndSystem.commit_transactions(OLD_MASTER_PATH, NEW_MASTER_PATH, LOG_FILE_PATH, CURR_ACC_PATH)
\ No newline at end of file
+if __name__ == "__main__":
+    with PrintSink():
+        BackEndSystem.commit_transactions(OLD_MASTER_PATH, NEW_MASTER_PATH, LOG_FILE_PATH, CURR_ACC_PATH)
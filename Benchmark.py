@@ -0,0 +1,221 @@
+import argparse
+import gc
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from Account import Account
+from AccountStore import AccountStore
+from BackEndSystem import BackEndSystem
+from ErrorSink import ErrorSink
+from FileIO import FileIO
+from Toolbox import Toolbox
+from TransactionHandler import TransactionHandler
+
+class Benchmark:
+    """
+    Generates synthetic bank files and times the back end phases against a stored baseline
+    """
+
+    # Relative frequency of each transaction code in generated logs
+    DEFAULT_CODE_MIX = {0: 5, 1: 25, 2: 10, 3: 15, 4: 35, 5: 4, 6: 2, 7: 2, 8: 2}
+
+    # Lines generated per bulk write
+    CHUNK_LINES = 65536
+
+    # Most log lines naming one account, keeping its transaction count within the master's four digits
+    ACCOUNT_LINE_CAP = 8000
+
+    @staticmethod
+    def generate_master(file_path, accounts=10000, seed=0):
+        """
+        Writes a valid master accounts file with given number of distinct accounts (at most 99,999)
+        Returns sorted list of account numbers written
+        """
+        rng = random.Random(seed)
+        numbers = sorted(rng.sample(range(1, 100000), accounts), key=lambda n: Toolbox.account_key(str(n)))
+        with open(file_path, 'w') as file:
+            for start in range(0, len(numbers), Benchmark.CHUNK_LINES):
+                file.write(''.join(
+                    f"{number:05d} {'Holder ' + str(number):<20} {'D' if rng.random() < 0.05 else 'A'} "
+                    f"{rng.randrange(10000000) / 100:08.2f} {rng.randrange(1000):04d} {rng.choice(('NP', 'SP'))}\n"
+                    for number in numbers[start:start + Benchmark.CHUNK_LINES]))
+        return numbers
+
+    @staticmethod
+    def generate_log(file_path, numbers, transactions=100000, seed=0, code_mix=None, zipf=1.1, error_rate=0.01):
+        """
+        Writes a merged transaction log drawing accounts from numbers with Zipf-skewed popularity
+        A fraction error_rate of lines are malformed or name accounts that do not exist.
+        Accounts stop being drawn once they reach ACCOUNT_LINE_CAP lines.
+        Raises ValueError when numbers cannot supply that many lines
+        """
+        accounts = len(set(numbers))
+        if transactions > accounts * Benchmark.ACCOUNT_LINE_CAP:
+            raise ValueError(f"Cannot draw {transactions} transactions from {accounts} accounts "
+                             f"of at most {Benchmark.ACCOUNT_LINE_CAP} lines each")
+
+        rng = random.Random(seed)
+        code_mix = code_mix or Benchmark.DEFAULT_CODE_MIX
+        codes = list(code_mix)
+        code_weights = list(itertools.accumulate(code_mix[code] for code in codes))
+
+        # Hot accounts are a random subset so popularity is independent of account number
+        hot = list(numbers)
+        rng.shuffle(hot)
+        account_weights = list(itertools.accumulate(1 / rank ** zipf for rank in range(1, len(hot) + 1)))
+        existing = set(numbers)
+        missing = [number for number in range(1, 100000) if number not in existing] or [0]
+        used = dict.fromkeys(numbers, 0)
+
+        misc = {2: ('SD', 'RV'), 3: ('EC', 'CQ', 'FI'), 5: ('NP', 'SP'), 7: ('D ', 'A '), 8: ('NP', 'SP')}
+        with open(file_path, 'w') as file:
+            for start in range(0, transactions, Benchmark.CHUNK_LINES):
+                count = min(Benchmark.CHUNK_LINES, transactions - start)
+                lines = []
+                for code, number in zip(rng.choices(codes, cum_weights=code_weights, k=count),
+                                        rng.choices(hot, cum_weights=account_weights, k=count)):
+                    while used[number] >= Benchmark.ACCOUNT_LINE_CAP:
+                        number = rng.choice(numbers)
+                    used[number] += 1
+                    if rng.random() < error_rate:
+                        if rng.random() < 0.5:
+                            lines.append(f"{code:02d} Malformed {number}\n")
+                            continue
+                        number = rng.choice(missing)
+                    if code == 5:
+                        number = rng.choice(missing)
+                    amount = 0 if code in (0, 6, 7, 8) else rng.randrange(50000) / 100
+                    flag = rng.choice(misc[code]) if code in misc else '  '
+                    lines.append(f"{code:02d} {'Holder ' + str(number):<20} {number:05d} {amount:08.2f} {flag}\n")
+                file.write(''.join(lines))
+
+    @staticmethod
+    def run(accounts=10000, transactions=100000, seed=0, repeat=3, memory=True, directory=None):
+        """
+        Times each back end phase on generated files, keeping the fastest of repeat runs
+        Returns {case: {'seconds': ..., 'peak_bytes': ...}} with peak traced memory when memory is set
+        """
+        with tempfile.TemporaryDirectory(dir=directory) as tmp:
+            old_master = os.path.join(tmp, "old_master.txt")
+            log = os.path.join(tmp, "log.txt")
+            new_master = os.path.join(tmp, "new_master.txt")
+            current = os.path.join(tmp, "current.txt")
+            numbers = Benchmark.generate_master(old_master, accounts, seed)
+            Benchmark.generate_log(log, numbers, transactions, seed)
+
+            # Errors are expected in generated logs and would only measure terminal output
+            with ErrorSink():
+                loaded = FileIO.read_old_bank_accounts(old_master)
+                parsed = FileIO.read_transactions(log)
+                applied = AccountStore(Benchmark._copy(loaded))
+                TransactionHandler.apply(applied, parsed)
+
+                cases = {
+                    'read_old_bank_accounts': (lambda: FileIO.read_old_bank_accounts(old_master)),
+                    'read_old_bank_accounts_mapped': (lambda: FileIO.read_old_bank_accounts_mapped(old_master)),
+                    'read_transactions': (lambda: FileIO.read_transactions(log)),
+                    'apply': (lambda: TransactionHandler.apply(AccountStore(Benchmark._copy(loaded)), parsed)),
+                    'write_new_master_accounts': (lambda: FileIO.write_new_master_accounts(applied, new_master)),
+                    'write_new_current_accounts': (lambda: FileIO.write_new_current_accounts(applied, current)),
+                    'write_new_accounts': (lambda: FileIO.write_new_accounts(applied, new_master, current)),
+                    'commit_transactions': (lambda: BackEndSystem.commit_transactions(old_master, new_master, log,
+                                                                                      current)),
+                }
+
+                results = {name: Benchmark._measure(case, repeat, memory) for name, case in cases.items()}
+            return results
+
+    @staticmethod
+    def _copy(accounts):
+        """
+        Returns fresh copies of accounts so each apply run starts from the same state
+        """
+        return [Account(*(account[field] for field in Account.FIELDS)) for account in accounts]
+
+    @staticmethod
+    def _measure(case, repeat, memory):
+        """
+        Returns fastest wall time over repeat runs and peak traced memory of one more run
+        """
+        seconds = []
+        for _ in range(repeat):
+            gc.collect()
+            start = time.perf_counter()
+            case()
+            seconds.append(time.perf_counter() - start)
+
+        result = {'seconds': min(seconds)}
+        if memory:
+            gc.collect()
+            tracemalloc.start()
+            case()
+            result['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        return result
+
+    @staticmethod
+    def compare(results, baseline, tolerance=0.2):
+        """
+        Compares results against baseline results
+        Returns list of (case, metric, baseline value, value, ratio, regressed) rows
+        """
+        rows = []
+        for name, metrics in results.items():
+            for metric, value in metrics.items():
+                expected = baseline.get(name, {}).get(metric)
+                if not expected:
+                    continue
+                ratio = value / expected
+                rows.append((name, metric, expected, value, ratio, ratio > 1 + tolerance))
+        return rows
+
+    @staticmethod
+    def main(argv=None):
+        """
+        Command line entry point, returning non-zero exit status when a case regressed
+        """
+        parser = argparse.ArgumentParser(description="Benchmark the bank back end on synthetic files")
+        parser.add_argument('--accounts', type=int, default=10000)
+        parser.add_argument('--transactions', type=int, default=100000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--no-memory', action='store_true', help="skip traced peak memory runs")
+        parser.add_argument('--baseline', default="test_files/benchmark_baseline.json")
+        parser.add_argument('--save-baseline', action='store_true', help="store results as the new baseline")
+        parser.add_argument('--tolerance', type=float, default=0.2, help="allowed slowdown before a regression")
+        args = parser.parse_args(argv)
+
+        results = Benchmark.run(args.accounts, args.transactions, args.seed, args.repeat, not args.no_memory)
+        for name, metrics in results.items():
+            peak = f"{metrics['peak_bytes'] / 2 ** 20:10.1f} MiB" if 'peak_bytes' in metrics else ""
+            print(f"{name:<32} {metrics['seconds']:10.4f} s {peak}")
+
+        if args.save_baseline:
+            with open(args.baseline, 'w') as file:
+                json.dump({'accounts': args.accounts, 'transactions': args.transactions, 'results': results},
+                          file, indent=2)
+            return 0
+
+        if not os.path.exists(args.baseline):
+            return 0
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        if (baseline['accounts'], baseline['transactions']) != (args.accounts, args.transactions):
+            print("Baseline was recorded at a different size, not comparing")
+            return 0
+
+        regressed = False
+        for name, metric, expected, value, ratio, slower in Benchmark.compare(results, baseline['results'],
+                                                                              args.tolerance):
+            print(f"{name:<32} {metric:<10} {ratio:6.2f}x baseline{'  REGRESSION' if slower else ''}")
+            regressed |= slower
+        return 1 if regressed else 0
+
+if __name__ == "__main__":
+    sys.exit(Benchmark.main())
@@ -0,0 +1,14 @@
+from Toolbox import Toolbox
+from TransactionHandler import TransactionHandler
+
+class CentsTransactionHandler(TransactionHandler):
+    """
+    Handles the application of transactions to accounts whose balances and amounts are integer cents
+    Limit checks and message formatting are pure integer operations free of float rounding error
+    """
+
+    # Largest balance an account may hold, in cents
+    BALANCE_LIMIT = 9999999
+
+    # Formats cent amounts in constraint error messages
+    format_amount = staticmethod(Toolbox.format_cents)
@@ -0,0 +1,184 @@
+import json
+import queue
+import sys
+import threading
+from collections import Counter, namedtuple
+
+# Structured form of one reported error
+ErrorRecord = namedtuple('ErrorRecord', ['constraint_type', 'description', 'account_number', 'line_number', 'transaction_code'])
+
+class ErrorSink:
+    """
+    Buffers structured error records and flushes them in bulk, optionally from a background writer thread
+    Installed as Toolbox.error_sink while used as a context manager; subclasses decide how batches are written
+    """
+
+    # Constraint type of invalid input file lines
+    FATAL = "Fatal error"
+
+    def __init__(self, buffer_size=4096, background=False):
+        self.buffer_size = buffer_size
+        self.counts = Counter()
+        self._buffer = []
+        self._previous = None
+        self._queue = None
+        self._thread = None
+        self._failure = None
+        if background:
+            self._queue = queue.Queue()
+            self._thread = threading.Thread(target=self._drain, daemon=True)
+            self._thread.start()
+
+    def __enter__(self):
+        from Toolbox import Toolbox
+        self._previous = Toolbox.error_sink
+        Toolbox.error_sink = self
+        return self
+
+    def __exit__(self, *exc_info):
+        from Toolbox import Toolbox
+        Toolbox.error_sink = self._previous
+        self.close()
+
+    def record(self, constraint_type, description, transaction=None, line_number=None):
+        """
+        Records an error raised while applying given transaction or reading given line
+        """
+        if transaction is not None:
+            self.add(ErrorRecord(constraint_type, description, transaction.get('account_number'),
+                                 transaction.get('line_number'), transaction.get('transaction_code')))
+        else:
+            self.add(ErrorRecord(constraint_type, description, None, line_number, None))
+
+    def add(self, record):
+        """
+        Buffers an error record, flushing once the buffer is full
+        """
+        self.counts[record.constraint_type] += 1
+        self._buffer.append(record)
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self, wait=False):
+        """
+        Hands buffered records to the writer
+        With wait, also blocks until the background writer has written every batch handed to it
+        Raises the error of a failed background write, after which no further batches are written
+        """
+        if self._buffer:
+            batch, self._buffer = self._buffer, []
+            if self._queue is not None:
+                self._queue.put(batch)
+            else:
+                self.write(batch)
+        if wait and self._queue is not None:
+            self._queue.join()
+        self._raise_failure()
+
+    def close(self):
+        """
+        Flushes remaining records and waits for the background writer to finish
+        Raises the error of a failed background write
+        """
+        try:
+            self.flush()
+        finally:
+            if self._thread is not None:
+                self._queue.put(None)
+                self._thread.join()
+                self._thread = None
+        self._raise_failure()
+
+    def write(self, records):
+        """
+        Writes a batch of records, dropping them by default
+        """
+
+    def _drain(self):
+        """
+        Background writer loop writing batches in the order they were flushed
+        Once a write fails, the error is kept for flush and close and later batches are dropped
+        """
+        while True:
+            batch = self._queue.get()
+            try:
+                if batch is None:
+                    return
+                if self._failure is None:
+                    self.write(batch)
+            except Exception as error:
+                self._failure = error
+            finally:
+                self._queue.task_done()
+
+    def _raise_failure(self):
+        """
+        Raises the error of a failed background write, if any
+        """
+        if self._failure is not None:
+            raise self._failure
+
+    @staticmethod
+    def format(record):
+        """
+        Formats record as the required ERROR: <type>: <description> line
+        """
+        if record.constraint_type == ErrorSink.FATAL:
+            return f"ERROR: {ErrorSink.FATAL} - Line {record.line_number}: {record.description}"
+        return f"ERROR: {record.constraint_type}: {record.description}"
+
+
+class PrintSink(ErrorSink):
+    """
+    Compatibility sink writing the exact ERROR: <type>: <description> lines in bulk
+    """
+
+    def __init__(self, stream=None, buffer_size=4096, background=False):
+        self.stream = stream
+        super().__init__(buffer_size, background)
+
+    def write(self, records):
+        stream = self.stream or sys.stdout
+        stream.write(''.join(ErrorSink.format(record) + "\n" for record in records))
+        stream.flush()
+
+
+class JsonLinesSink(ErrorSink):
+    """
+    Writes each record as a JSON object per line for aggregation
+    """
+
+    def __init__(self, stream, buffer_size=4096, background=False):
+        self.stream = stream
+        super().__init__(buffer_size, background)
+
+    def write(self, records):
+        self.stream.write(''.join(json.dumps(record._asdict()) + "\n" for record in records))
+        self.stream.flush()
+
+
+class CollectingSink(ErrorSink):
+    """
+    Keeps every record in memory, in the order reported
+    """
+
+    def __init__(self):
+        super().__init__(buffer_size=1)
+        self.records = []
+
+    def write(self, records):
+        self.records.extend(records)
+
+
+class SequencedSink(CollectingSink):
+    """
+    Keeps every record in memory along with the seq number carried by the transaction that raised it
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.sequence = []
+
+    def record(self, constraint_type, description, transaction=None, line_number=None):
+        self.sequence.append(None if transaction is None else transaction.get('seq'))
+        super().record(constraint_type, description, transaction, line_number)
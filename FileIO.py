@@ -1,250 +1,926 @@
+import gc
+import heapq
+import locale
+import mmap
+import os
+import pickle
+import struct
+import tempfile
+import zlib
+from contextlib import contextmanager
+from itertools import repeat
+from multiprocessing import Pool
+
+try:
+    import numpy
+except ImportError:  # Vectorized master reader falls back to the line by line reader
+    numpy = None
+
+from Account import Account
+from AccountStore import AccountStore
+from ErrorSink import CollectingSink
+from Metrics import Metrics
+from RecordSchema import Field, RecordSchema
+from Toolbox import Toolbox
+
 class FileIO:
     """
     A static class which manages all file input and output functions
     """
 
+    # Sentinel record closing every Current Bank Accounts File
+    CURRENT_ACCOUNTS_END = "00000 END_OF_FILE          A 00000.00 NP\n"
+
+    # Bytes read from the transaction file at a time, tunable for the underlying storage
+    TRANSACTION_CHUNK_SIZE = 1 << 20
+
+    # Record overwriting deleted accounts in a master file updated in place
+    MASTER_TOMBSTONE = "00000 DELETED              D 00000.00 0000 NP"
+
+    # Bytes per merged transaction record, newline included
+    TRANSACTION_RECORD_SIZE = 42
+
+    # Account lines buffered before each bulk write
+    WRITE_BATCH_LINES = 8192
+
+    # Shared plan strings so accounts do not each hold their own copy
+    PLANS = {"NP": "NP", "SP": "SP"}
+
+    # Fixed width record layouts the readers and writers are built from
+    MASTER_RECORD = RecordSchema([
+        Field('account_number', 0, 5, 'number'),
+        Field('name', 6, 20, 'text'),
+        Field('status', 27, 1, 'choice', values=('A', 'D')),
+        Field('balance', 29, 8, 'amount', low=0, high=99999.99),
+        Field('total_transactions', 38, 4, 'count', label='transaction count', low=0, high=9999),
+        Field('plan', 43, 2, 'choice', values=PLANS, invalid="Invalid plan '{status}'"),
+    ], 45)
+    CURRENT_RECORD = RecordSchema([
+        Field('account_number', 0, 5, 'number'),
+        Field('name', 6, 20, 'text'),
+        Field('status', 27, 1, 'choice', values=('A', 'D')),
+        Field('balance', 29, 8, 'amount', low=0, high=99999.99),
+        Field('plan', 38, 2, 'choice', values=PLANS),
+    ], 40)
+    TRANSACTION_RECORD = RecordSchema([
+        Field('transaction_code', 0, 2, 'count', low=0, high=8, out_of_range="Invalid transaction code '{raw}'"),
+        Field('name', 3, 20, 'text'),
+        Field('account_number', 24, 5, 'number'),
+        Field('amount', 30, 8, 'amount', label='transaction amount', low=0, out_of_range="Negative balance"),
+        Field('misc', 39, 2, 'raw'),
+    ], 41)
+
+    # Column ranges of a plain master record making up the current accounts record of the same account
+    CURRENT_RANGES = MASTER_RECORD.ranges(CURRENT_RECORD)
+
+    # Binary snapshot header: magic, version, record count, master size, master CRC-32, records CRC-32
+    SNAPSHOT_HEADER = struct.Struct('<4sHIQII')
+    SNAPSHOT_MAGIC = b'BKSN'
+    SNAPSHOT_VERSION = 1
+
+    # Binary snapshot record: account number, padded name, status and first plan character codes,
+    # transaction count and balance in cents
+    SNAPSHOT_RECORD = struct.Struct('<I20sBBHq')
+
     # //// STARTER CODE: DO NOT ALTER ////
     @staticmethod
-    def read_old_bank_accounts(file_path):
+    def read_old_bank_accounts(file_path, cents=False):
         """
         Reads and validates the bank account file format
         Returns list of accounts and prints fatal errors for invalid format
+        Balances are integer cents instead of floats when cents is set
+        """
+        return list(FileIO.iter_old_bank_accounts(file_path, cents))
+
+
+    @staticmethod
+    def iter_old_bank_accounts(file_path, cents=False):
+        """
+        Reads and validates the bank account file format one line at a time
+        Yields accounts in file order and prints fatal errors for invalid format
         """
-        accounts = []
         with open(file_path, 'r') as file:
             for line_num, line in enumerate(file, 1):
                 # Remove newline but preserve other characters
                 clean_line = line.rstrip('\n')
 
-                # Validate line length
-                if len(clean_line) != 45:
-                    print(f"ERROR: Fatal error - Line {line_num}: Invalid length ({len(clean_line)} chars)")
+                # Skip records of deleted accounts left by in place updates
+                if clean_line == FileIO.MASTER_TOMBSTONE:
                     continue
 
                 try:
-                    # Extract fields with positional validation
-                    account_number = clean_line[0:5]
-                    name = clean_line[6:26]  # 20 characters
-                    status = clean_line[27]
-                    balance_str = clean_line[29:37]  # 8 characters
-                    transactions_str = clean_line[38:42]  # 4 characters
-                    plan = clean_line[43:45] # 2 characters
-
-                    # Validate account number format (5 digits)
-                    if not account_number.isdigit():
-                        print(f"ERROR: Fatal error - Line {line_num}: Invalid account number format")
-                        continue
+                    values = FileIO.MASTER_RECORD.parse(clean_line, cents)
+                except ValueError as e:
+                    Toolbox.log_fatal_error(line_num, str(e))
+                    continue
 
-                    # Validate status
-                    if status not in ('A', 'D'):
-                        print(f"ERROR: Fatal error - Line {line_num}: Invalid status '{status}'")
-                        continue
+                # Records that format back to the same text are kept for writers to copy
+                source = None
+                if FileIO.MASTER_RECORD.is_plain(clean_line, values):
+                    source = line if len(line) == 46 else clean_line + "\n"
 
-                    # Validate balance format (XXXXX.XX)
-                    if (len(balance_str) != 8 or
-                            balance_str[5] != '.' or
-                            not balance_str[:5].isdigit() or
-                            not balance_str[6:].isdigit()):
-                        print(f"ERROR: Fatal error - Line {line_num}: Invalid balance format")
-                        continue
+                yield Account(*values, source, 0)
 
-                    # Validate transaction count format
-                    if not transactions_str.isdigit():
-                        print(f"ERROR: Fatal error - Line {line_num}: Invalid transaction count format")
-                        continue
 
-                    # Validate plan
-                    if plan not in ("NP", "SP"):
-                        print(f"ERROR: Fatal error - Line {line_num}: Invalid plan '{status}'")
-                        continue
 
-                    # Convert numerical values
-                    balance = float(balance_str)
-                    transactions = int(transactions_str)
-
-                    # Validate business constraints
-                    if balance < 0:
-                        print(f"ERROR: Fatal error - Line {line_num}: Negative balance")
-                        continue
-                    if transactions < 0:
-                        print(f"ERROR: Fatal error - Line {line_num}: Negative transaction count")
-                        continue
+    @staticmethod
+    def read_old_bank_accounts_mapped(file_path, cents=False):
+        """
+        Reads and validates the bank account file as a memory-mapped fixed-stride byte matrix
+        Returns the same accounts and prints the same fatal errors as read_old_bank_accounts,
+        which it falls back to when NumPy is unavailable or lines are not all 45 ASCII characters
+        """
+        size = os.path.getsize(file_path)
+        if numpy is None or size == 0:
+            return FileIO.read_old_bank_accounts(file_path, cents)
+
+        # Every record is 45 characters plus newline, the last newline being optional
+        rows = -(-size // 46)
+        if rows * 46 - size > 1:
+            return FileIO.read_old_bank_accounts(file_path, cents)
+
+        with open(file_path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            buffer = numpy.frombuffer(data, dtype=numpy.uint8)
+            if rows * 46 != size:
+                buffer = numpy.append(buffer, numpy.uint8(10))
+            parsed = FileIO._parse_master_matrix(buffer.reshape(rows, 46), cents)
+            # Views into the map must be gone before it closes
+            del buffer
+            if parsed is not None:
+                source = data[:].decode('ascii') + "\n" * (rows * 46 - size)
+
+        if parsed is None:
+            return FileIO.read_old_bank_accounts(file_path, cents)
+
+        errors, records, offsets, plain = parsed
+        for line_num, message in errors:
+            Toolbox.log_fatal_error(line_num, message)
+        return FileIO._accounts_from_records(records, cents, source, offsets, plain)
 
-                    accounts.append({
-                        'account_number': account_number.lstrip('0') or '0',
-                        'name': name.strip(),
-                        'status': status,
-                        'balance': balance,
-                        'total_transactions': transactions,
-                        'plan': plan
-                    })
-
-                except Exception as e:
-                    print(f"ERROR: Fatal error - Line {line_num}: Unexpected error: {str(e)}")
-                    continue
 
+    @staticmethod
+    def load_old_bank_accounts(file_path, cents=False):
+        """
+        Reads the bank account file from its binary snapshot when a valid one matches it,
+        otherwise with the mapped text reader
+        """
+        accounts = FileIO.read_snapshot(file_path, cents)
+        if accounts is None:
+            return FileIO.read_old_bank_accounts_mapped(file_path, cents)
         return accounts
 
 
+    @staticmethod
+    def snapshot_path(file_path):
+        """
+        Returns path of the binary snapshot kept beside given master file
+        """
+        return f"{file_path}.snap"
+
+
+    @staticmethod
+    def read_snapshot(file_path, cents=False):
+        """
+        Loads the accounts of given master file from its binary snapshot without parsing any text
+        Returns None when the snapshot is missing, damaged, of another version or does not match the master
+        """
+        try:
+            with open(FileIO.snapshot_path(file_path), 'rb') as file:
+                data = file.read()
+            with open(file_path, 'rb') as file:
+                master = file.read()
+        except OSError:
+            return None
+
+        header = FileIO.SNAPSHOT_HEADER
+        if len(data) < header.size:
+            return None
+        magic, version, count, master_size, master_crc, records_crc = header.unpack_from(data)
+        records = memoryview(data)[header.size:]
+        if ((magic, version) != (FileIO.SNAPSHOT_MAGIC, FileIO.SNAPSHOT_VERSION) or
+                len(records) != count * FileIO.SNAPSHOT_RECORD.size or
+                (master_size, master_crc) != (len(master), zlib.crc32(master)) or
+                records_crc != zlib.crc32(records)):
+            return None
+
+        if numpy is not None:
+            records = numpy.frombuffer(records, dtype=FileIO._snapshot_dtype())
+            # Snapshots are only written for masters of whole ASCII records, the last newline being optional
+            master += b"\n" * (-len(master) % 46)
+            source = master.decode('ascii')
+            matrix = numpy.frombuffer(master, dtype=numpy.uint8).reshape(-1, 46)
+            return FileIO._accounts_from_records(records, cents, source,
+                                                 *FileIO._record_offsets(matrix, ~FileIO._deleted_rows(matrix)))
+
+        statuses = {65: 'A', 68: 'D'}
+        plans = {78: FileIO.PLANS['NP'], 83: FileIO.PLANS['SP']}
+        return [Account(str(number), name.decode('ascii').strip(), statuses[status], balance if cents else balance / 100,
+                        total_transactions, plans[plan])
+                for number, name, status, plan, total_transactions, balance
+                in FileIO.SNAPSHOT_RECORD.iter_unpack(records)]
+
+
+    @staticmethod
+    def write_snapshot(file_path):
+        """
+        Writes a binary snapshot of the master file, converted with the same checks as the mapped reader
+        The snapshot holds the master's size and checksum, so it is only loaded while they still match.
+        Returns whether a snapshot was written; none is when NumPy is unavailable or the master has invalid lines.
+        """
+        with open(file_path, 'rb') as file:
+            master = file.read()
+
+        parsed = None
+        rows = -(-len(master) // 46)
+        if numpy is not None and master and rows * 46 - len(master) <= 1:
+            buffer = numpy.frombuffer(master + b'\n' * (rows * 46 - len(master)), dtype=numpy.uint8)
+            parsed = FileIO._parse_master_matrix(buffer.reshape(rows, 46))
+        if parsed is None or parsed[0]:
+            if os.path.exists(FileIO.snapshot_path(file_path)):
+                os.remove(FileIO.snapshot_path(file_path))
+            return False
+
+        records = parsed[1].tobytes()
+        header = FileIO.SNAPSHOT_HEADER.pack(FileIO.SNAPSHOT_MAGIC, FileIO.SNAPSHOT_VERSION, len(parsed[1]),
+                                             len(master), zlib.crc32(master), zlib.crc32(records))
+        with FileIO.atomic_open(FileIO.snapshot_path(file_path), 'wb') as file:
+            file.write(header)
+            file.write(records)
+        return True
+
 
     @staticmethod
-    def read_transactions(file_path):
+    def _parse_master_matrix(matrix, cents=False):
+        """
+        Validates and converts master records held as rows of a byte matrix
+        Returns (line errors, snapshot records, record offsets, plain record mask), the last two as from
+        _record_offsets, or None when rows are not plain newline terminated ASCII
+        """
+        if (matrix[:, 45] != 10).any() or (matrix[:, :45] >= 128).any() or (matrix[:, :45] == 13).any():
+            return None
+
+        digits = (matrix >= 48) & (matrix <= 57)
+        status = matrix[:, 27]
+        plan = matrix[:, 43]
+
+        # Checks in the order the line by line reader applies them
+        checks = [
+            (digits[:, 0:5].all(1), lambda row: "Invalid account number format"),
+            ((status == 65) | (status == 68), lambda row: f"Invalid status '{chr(row[27])}'"),
+            (digits[:, 29:34].all(1) & (matrix[:, 34] == 46) & digits[:, 35:37].all(1),
+             lambda row: "Invalid balance format"),
+            (digits[:, 38:42].all(1), lambda row: "Invalid transaction count format"),
+            (((plan == 78) | (plan == 83)) & (matrix[:, 44] == 80),
+             lambda row: f"Invalid plan '{chr(row[27])}'"),
+        ]
+        valid = numpy.logical_and.reduce([passed for passed, _ in checks])
+
+        # Records of deleted accounts left by in place updates are skipped silently
+        deleted = FileIO._deleted_rows(matrix)
+        valid &= ~deleted
+
+        errors = []
+        for index in numpy.flatnonzero(~(valid | deleted)).tolist():
+            for passed, message in checks:
+                if not passed[index]:
+                    errors.append((index + 1, message(matrix[index].tolist())))
+                    break
+
+        rows = matrix[valid]
+        values = rows.astype(numpy.int64) - 48
+        records = numpy.empty(len(rows), dtype=FileIO._snapshot_dtype())
+        records['number'] = values[:, 0:5] @ numpy.array([10000, 1000, 100, 10, 1])
+        records['name'] = rows[:, 6:26].copy().view('S20').ravel()
+        records['status'] = rows[:, 27]
+        records['plan'] = rows[:, 43]
+        records['total_transactions'] = values[:, 38:42] @ numpy.array([1000, 100, 10, 1])
+        records['balance'] = values[:, [29, 30, 31, 32, 33, 35, 36]] @ numpy.array([1000000, 100000, 10000, 1000,
+                                                                                   100, 10, 1])
+        return (errors, records) + FileIO._record_offsets(matrix, valid)
+
+
+    @staticmethod
+    def _record_offsets(matrix, rows):
+        """
+        Returns (byte offsets, plain mask) of the selected rows of a master byte matrix, rows with other
+        separators than spaces not being plain, as their text formats differently
+        """
+        plain = (matrix[:, FileIO.MASTER_RECORD.separators] == 32).all(1)[rows]
+        return numpy.flatnonzero(rows) * 46, plain
+
+
+    @staticmethod
+    def _deleted_rows(matrix):
+        """
+        Returns mask of the rows of a master byte matrix holding tombstone records
+        """
+        tombstone = numpy.frombuffer(FileIO.MASTER_TOMBSTONE.encode('ascii'), dtype=numpy.uint8)
+        return (matrix[:, :45] == tombstone).all(1)
+
+
+    @staticmethod
+    def _snapshot_dtype():
+        """
+        Returns NumPy dtype of a snapshot record
+        """
+        return numpy.dtype([('number', '<u4'), ('name', 'S20'), ('status', 'u1'), ('plan', 'u1'),
+                            ('total_transactions', '<u2'), ('balance', '<i8')])
+
+
+    @staticmethod
+    def _accounts_from_records(records, cents, source, offsets, plain):
+        """
+        Builds accounts from an array of snapshot records read from the master text in source
+        Accounts keep their record's offset in source, and source itself when the record is plain
+        and formats back to the same text
+        """
+        names = records['name'].tobytes().decode('ascii')
+        fields = [names[i:i + 20] for i in range(0, len(names), 20)]
+        balances = records['balance']
+        statuses = {65: 'A', 68: 'D'}
+        plans = {78: FileIO.PLANS['NP'], 83: FileIO.PLANS['SP']}
+
+        # Build each column as a list so the per-account work is a single constructor call, without
+        # cyclic garbage collection passes triggered by allocating so many objects at once
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            accounts = list(map(
+                Account,
+                map(str, records['number'].tolist()),
+                [field.strip() for field in fields],
+                map(statuses.__getitem__, records['status'].tolist()),
+                balances.tolist() if cents else (balances / 100).tolist(),
+                records['total_transactions'].tolist(),
+                map(plans.__getitem__, records['plan'].tolist()),
+                repeat(source),
+                offsets.tolist()
+            ))
+        finally:
+            if enabled:
+                gc.enable()
+
+        # Names padded with other whitespace than trailing spaces format differently
+        if ''.join(account.name.ljust(20) for account in accounts) != names or not plain.all():
+            for account, field, is_plain in zip(accounts, fields, plain.tolist()):
+                if not is_plain or account.name.ljust(20) != field:
+                    account.source = None
+        return accounts
+
+
+    @staticmethod
+    def read_transactions(file_path, cents=False):
         """
         Reads and validates the merged transaction file format
         Returns list of sequential transactions and prints fatal errors for invalid format
+        Amounts are integer cents instead of floats when cents is set
+        """
+        return list(FileIO.iter_transactions(file_path, cents=cents))
+
+
+    @staticmethod
+    def read_transactions_parallel(file_path, processes=None, cents=False):
         """
+        Reads and validates the merged transaction file across a process pool
+        Returns the same transactions and reports the same fatal errors, in the same order, as read_transactions.
+        Records are split into byte ranges at the fixed 41 characters plus newline stride. From the first line
+        breaking that stride on, or throughout with a single process, the file is read with the chunked reader.
+        """
+        ranges, rest = FileIO._parse_transactions_parallel(file_path, processes, cents, True)
         transactions = []
-        with open(file_path, 'r') as file:
-            for line_num, line in enumerate(file, 1):
-                # Remove newline but preserve other characters
-                clean_line = line.rstrip('\n')
+        for columns in ranges:
+            # Ranges send back columns, which cross the process boundary far cheaper than dicts
+            transactions.extend({
+                'transaction_code': tr_code,
+                'name': name,
+                'account_number': account_number,
+                'amount': amount,
+                'misc': misc,
+                'line_number': line_num
+            } for tr_code, name, account_number, amount, misc, line_num in zip(*columns))
+        transactions.extend(rest)
+        return transactions
 
-                # Validate line length
-                if len(clean_line) != 41:
-                    print(f"ERROR: Fatal error - Line {line_num}: Invalid length ({len(clean_line)} chars)")
-                    continue
+    @staticmethod
+    def validate_transactions(file_path, processes=None):
+        """
+        Validates the merged transaction file across a process pool like read_transactions_parallel
+        Reports the same fatal errors in the same order and returns the number of valid transactions
+        """
+        ranges, rest = FileIO._parse_transactions_parallel(file_path, processes, False, False)
+        return sum(ranges) + sum(1 for _ in rest)
 
-                try:
-                    # Extract fields with positional validation
-                    tr_code_str = clean_line[0:2]
-                    name = clean_line[3:23]  # 20 characters
-                    account_number = clean_line[24:29]
-                    amount_str = clean_line[30:38]  # 8 characters
-                    misc = clean_line[39:42]  # 2 characters
-
-                    # Validate transaction code
-                    if not tr_code_str.isdigit():
-                        print(f"ERROR: Fatal error - Line {line_num}: Invalid transaction code format")
-                        continue
+    @staticmethod
+    def _parse_transactions_parallel(file_path, processes, cents, keep):
+        """
+        Parses the aligned leading records of the transaction file in a process pool
+        Returns (range results, remaining transactions), both lazy and reporting fatal errors in line order
+        when consumed in turn. Range results are transaction columns when keep is set, otherwise counts.
+        """
+        processes = processes or os.cpu_count() or 1
+        records, aligned = (0, False) if processes == 1 else FileIO._aligned_transaction_records(file_path)
+
+        results = []
+        if records:
+            # Several ranges per process even out ranges that parse slower
+            step = -(-records // (processes * 4))
+            ranges = [(file_path, start, min(start + step, records), cents, keep)
+                      for start in range(0, records, step)]
+            with Pool(min(processes, len(ranges))) as pool:
+                results = pool.map(FileIO._parse_transaction_range, ranges)
+
+        def ranges():
+            for parsed, errors in results:
+                for record in errors:
+                    Toolbox.log_error_record(record)
+                yield parsed
+
+        rest = ()
+        if not aligned:
+            rest = FileIO._iter_transactions(file_path, FileIO.TRANSACTION_CHUNK_SIZE, cents, 0, None, records,
+                                             records * FileIO.TRANSACTION_RECORD_SIZE)
+        return ranges(), rest
 
-                    # Validate account number format (5 digits)
-                    if not account_number.isdigit():
-                        print(f"ERROR: Fatal error - Line {line_num}: Invalid account number format")
-                        continue
+    @staticmethod
+    def _transaction_columns(transactions):
+        """
+        Returns transactions as a list of columns in parse_transaction field order
+        """
+        return [[transaction[field] for transaction in transactions]
+                for field in ('transaction_code', 'name', 'account_number', 'amount', 'misc', 'line_number')]
 
-                    # Validate transaction amount format (XXXXX.XX)
-                    if (len(amount_str) != 8 or
-                            amount_str[5] != '.' or
-                            not amount_str[:5].isdigit() or
-                            not amount_str[6:].isdigit()):
-                        print(f"ERROR: Fatal error - Line {line_num}: Invalid transaction amount format")
+    @staticmethod
+    def _aligned_transaction_records(file_path):
+        """
+        Counts leading records of a transaction file that are 41 bytes plus newline, the last newline being optional
+        Returns (record count, whether the whole file is made of such records)
+        """
+        size = FileIO.TRANSACTION_RECORD_SIZE
+        records = 0
+        with open(file_path, 'rb') as file:
+            # Whole records per read so every chunk starts on a record boundary
+            while chunk := file.read(size * (FileIO.TRANSACTION_CHUNK_SIZE // size)):
+                whole = len(chunk) // size
+                if (chunk[size - 1::size] == b'\n' * whole and chunk.count(b'\n') == whole and
+                        b'\r' not in chunk):
+                    records += whole
+                    tail = chunk[whole * size:]
+                    if not tail:
                         continue
+                    # Only the last record may lack its newline
+                    return records + (len(tail) == size - 1), len(tail) == size - 1
 
-                    # Convert numerical values
-                    tr_code = int(tr_code_str)
-                    amount = float(amount_str)
+                for offset in range(0, len(chunk), size):
+                    record = chunk[offset:offset + size]
+                    if len(record) != size or record[-1] != 10 or record.count(b'\n') != 1 or b'\r' in record:
+                        return records, False
+                    records += 1
+        return records, True
 
-                    # Validate business constraints
-                    if amount < 0:
-                        print(f"ERROR: Fatal error - Line {line_num}: Negative balance")
-                        continue
-                    if tr_code < 0 or tr_code > 8:
-                        print(f"ERROR: Fatal error - Line {line_num}: Invalid transaction code '{tr_code_str}'")
-                        continue
+    @staticmethod
+    def _parse_transaction_range(task):
+        """
+        Parses records start up to stop of an aligned transaction file
+        Returns transaction columns of the range, or their count unless keep is set, and its fatal error records
+        """
+        file_path, start, stop, cents, keep = task
+        size = FileIO.TRANSACTION_RECORD_SIZE
+        with open(file_path, 'rb') as file:
+            file.seek(start * size)
+            lines = file.read((stop - start) * size).decode(locale.getpreferredencoding(False)).split('\n')
+        if lines[-1] == '':
+            lines.pop()
+
+        # Errors are reported by the parent once every range is parsed
+        with CollectingSink() as sink, Metrics.suspended():
+            transactions = (FileIO.parse_transaction(line_num, line, cents)
+                            for line_num, line in enumerate(lines, start + 1))
+            transactions = [transaction for transaction in transactions if transaction is not None]
+        if keep:
+            return FileIO._transaction_columns(transactions), sink.records
+        return len(transactions), sink.records
 
-                    transactions.append({
-                        'transaction_code': tr_code,
-                        'name': name.strip(),
-                        'account_number': account_number.lstrip('0') or '0',
-                        'amount': amount,
-                        'misc': misc
-                    })
+    @staticmethod
+    def iter_transactions(file_path, chunk_size=None, cents=False, start_line=0, stop_line=None):
+        """
+        Lazily reads and validates the merged transaction file in large binary chunks
+        Yields sequential transactions as they are parsed and prints fatal errors for invalid format
+        Only lines numbered after start_line and up to stop_line are parsed, keeping their line numbers
+        """
+        transactions = FileIO._iter_transactions(file_path, chunk_size or FileIO.TRANSACTION_CHUNK_SIZE, cents,
+                                                 start_line, stop_line)
+        if Metrics.active is not None:
+            return Metrics.active.timed('parse_transactions', transactions)
+        return transactions
+
+    @staticmethod
+    def merge_sessions(sessions, chunk_size=None, cents=False):
+        """
+        Lazily merges front end session files into the merged transaction log without writing it
+        sessions are (sequence, file path) pairs in any order; sessions are read one at a time in
+        sequence order, so memory does not grow with their size. Transactions are validated as they
+        are read and numbered by their line in the merged log.
+        """
+        transactions = FileIO._merge_sessions(sessions, chunk_size or FileIO.TRANSACTION_CHUNK_SIZE, cents)
+        if Metrics.active is not None:
+            return Metrics.active.timed('parse_transactions', transactions)
+        return transactions
+
+    @staticmethod
+    def _merge_sessions(sessions, chunk_size, cents):
+        """
+        Generator behind merge_sessions
+        """
+        # Heap of pending sessions, ties in sequence broken by arrival order
+        pending = [(sequence, order, file_path) for order, (sequence, file_path) in enumerate(sessions)]
+        heapq.heapify(pending)
+        line_num = 0
+        while pending:
+            _, _, file_path = heapq.heappop(pending)
+            line_num = yield from FileIO._iter_transactions(file_path, chunk_size, cents, 0, None, line_num)
+
+    @staticmethod
+    def _iter_transactions(file_path, chunk_size, cents, start_line, stop_line, first_line=0, offset=0):
+        """
+        Generator behind iter_transactions, reading from byte offset on and numbering lines after first_line
+        Returns number of the last line read
+        """
+        encoding = locale.getpreferredencoding(False)
+        line_num = first_line
+        carry = b''
+        with open(file_path, 'rb') as file:
+            file.seek(offset)
+            while True:
+                chunk = file.read(chunk_size)
+                buffer = carry + chunk
+                if chunk:
+                    # Only parse up to the last complete line, holding back a trailing \r that may start \r\n
+                    cut = max(buffer.rfind(b'\n'), buffer.rfind(b'\r', 0, len(buffer) - 1))
+                    block, carry = buffer[:cut + 1], buffer[cut + 1:]
+                else:
+                    block, carry = buffer, b''
+                if not block:
+                    if not chunk:
+                        return line_num
+                    continue
 
-                except Exception as e:
-                    print(f"ERROR: Fatal error - Line {line_num}: Unexpected error: {str(e)}")
+                # Split lines with the same universal newlines text mode uses
+                lines = block.decode(encoding).replace('\r\n', '\n').replace('\r', '\n').split('\n')
+                if lines[-1] == '':
+                    lines.pop()
+                if line_num + len(lines) <= start_line:
+                    line_num += len(lines)
                     continue
+                for line in lines:
+                    line_num += 1
+                    if line_num <= start_line:
+                        continue
+                    if stop_line is not None and line_num > stop_line:
+                        return line_num - 1
+                    transaction = FileIO.parse_transaction(line_num, line, cents)
+                    if transaction is not None:
+                        yield transaction
 
-        return transactions
+
+    @staticmethod
+    def sort_transactions(file_path, memory_budget=100000, cents=False):
+        """
+        Reads and validates the merged transaction file and yields its transactions
+        stably sorted by account number, keeping log order within each account.
+        At most memory_budget transactions are held in memory; larger logs are
+        sorted in runs spilled to temporary files and merged back together.
+        """
+        key = (lambda x: Toolbox.account_key(x['account_number']))
+        run = []
+        spilled = []
+        try:
+            for transaction in FileIO.iter_transactions(file_path, cents=cents):
+                run.append(transaction)
+                if len(run) >= memory_budget:
+                    spilled.append(FileIO._spill_run(sorted(run, key=key)))
+                    run = []
+
+            run.sort(key=key)
+            # heapq.merge favours earlier runs on ties so equal accounts keep log order
+            yield from heapq.merge(*[FileIO._read_run(file) for file in spilled], run, key=key)
+        finally:
+            for file in spilled:
+                file.close()
+
+
+    @staticmethod
+    def _spill_run(transactions):
+        """
+        Writes sorted run of transactions to an anonymous temporary file
+        Returns the file rewound for reading
+        """
+        file = tempfile.TemporaryFile()
+        pickler = pickle.Pickler(file, pickle.HIGHEST_PROTOCOL)
+        for transaction in transactions:
+            pickler.dump(transaction)
+        file.seek(0)
+        return file
+
+
+    @staticmethod
+    def _read_run(file):
+        """
+        Yields transactions back from a run written by _spill_run
+        """
+        unpickler = pickle.Unpickler(file)
+        while True:
+            try:
+                yield unpickler.load()
+            except EOFError:
+                return
+
+
+    @staticmethod
+    def parse_transaction(line_num, clean_line, cents=False):
+        """
+        Validates a single merged transaction record without its newline
+        Returns transaction or None after printing a fatal error for invalid format
+        """
+        try:
+            values = FileIO.TRANSACTION_RECORD.parse(clean_line, cents)
+        except ValueError as e:
+            Toolbox.log_fatal_error(line_num, str(e))
+            return None
+
+        transaction = dict(zip(FileIO.TRANSACTION_RECORD.names, values))
+        transaction['line_number'] = line_num
+        return transaction
 
 
     # //// STARTER CODE: DO NOT ALTER ////
     @staticmethod
-    def write_new_current_accounts(accounts, file_path):
+    def write_new_current_accounts(accounts, file_path, cents=False):
         """
         Writes Current Bank Accounts File with strict format validation.
         Raises ValueError for invalid data to enable testing.
         """
-        with open(file_path, 'w') as file:
+        with FileIO.atomic_open(file_path) as file:
             for acc in accounts:
-                # Validate account number
-                if not isinstance(acc['account_number'], str) or not acc['account_number'].isdigit():
-                    raise ValueError(f"Invalid account number: {acc['account_number']}")
-                if len(acc['account_number']) > 5:
-                    raise ValueError(f"Account number too long: {acc['account_number']}")
+                file.write(FileIO.format_current_account(acc, cents))
+
+            # Add END_OF_FILE marker
+            file.write(FileIO.CURRENT_ACCOUNTS_END)
 
-                # Validate name length
-                if len(acc['name']) > 20:
-                    raise ValueError(f"Name exceeds 20 characters: {acc['name']}")
 
-                # Validate status
-                if acc['status'] not in ('A', 'D'):
-                    raise ValueError(f"Invalid status: {acc['status']}")
 
-                # Validate balance
-                if not isinstance(acc['balance'], (int, float)):
-                    raise ValueError(f"Invalid balance type: {type(acc['balance'])}")
-                if acc['balance'] > 99999.99 or acc['balance'] < 0:
-                    raise ValueError(f"Balance out of range: {acc['balance']}")
+    @staticmethod
+    def write_new_master_accounts(accounts, file_path, cents=False):
+        """
+        Writes New Master Bank Accounts File with strict format validation.
+        Raises ValueError for invalid data to enable testing.
+        """
+        with FileIO.atomic_open(file_path) as file:
+            # Unchanged records adjacent in the master text they were read from are copied as one slice
+            lines = []
+            source = None
+            start = end = 0
+            for acc in FileIO.master_order(accounts):
+                record_source = getattr(acc, 'source', None)
+                if record_source is not None and record_source is source and acc.offset == end:
+                    end += 46
+                    continue
+
+                if source is not None:
+                    lines.append(source[start:end])
+                if record_source is not None:
+                    source, start, end = record_source, acc.offset, acc.offset + 46
+                else:
+                    source = None
+                    lines.append(FileIO.format_master_account(acc, cents))
 
-                # Validate status
-                if acc['plan'] not in ("NP", "SP"):
-                    raise ValueError(f"Invalid plan: {acc['plan']}")
+                if len(lines) >= FileIO.WRITE_BATCH_LINES:
+                    file.write(''.join(lines))
+                    lines.clear()
 
-                # Format fields
-                acc_num = acc['account_number'].zfill(5)
-                name = acc['name'].ljust(20)[:20]
-                balance = f"{acc['balance']:08.2f}"
+            if source is not None:
+                lines.append(source[start:end])
+            file.write(''.join(lines))
 
-                file.write(f"{acc_num} {name} {acc['status']} {balance} {acc['plan']}\n")
 
-            # Add END_OF_FILE marker
-            file.write("00000 END_OF_FILE          A 00000.00 NP\n")
+    @staticmethod
+    def update_master_accounts(accounts, file_path, compact_ratio=0.25, cents=False):
+        """
+        Updates Master Bank Accounts File in place, rewriting only the records of changed accounts
+        Accounts are expected as read_old_bank_accounts_mapped read them from the file, keeping each
+        record's offset: changed accounts, which no longer keep their record's text, are rewritten at
+        that offset, created ones appended and the records of deleted ones overwritten with tombstones.
+        The file is rewritten sorted and without tombstones once they exceed compact_ratio of its
+        records, or when accounts do not all hold a distinct record of it, as when it was read line by
+        line. Updates are flushed to disk before returning.
+        Returns number of records written.
+        Raises ValueError for invalid data to enable testing.
+        """
+        size = 46
+        tombstone = FileIO.MASTER_TOMBSTONE.encode('ascii')
+        file_size = os.path.getsize(file_path)
+        count = -(-file_size // size)
+        rows = FileIO._master_rows(accounts, count) if file_size and count * size - file_size <= 1 else None
+
+        if rows is not None:
+            held, changed, created = rows
+            # Records are formatted before any is written, so invalid data leaves the file untouched
+            writes = [(acc.offset, FileIO.format_master_account(acc, cents)[:-1].encode('ascii')) for acc in changed]
+            appends = [FileIO.format_master_account(acc, cents).encode('ascii') for acc in created]
+
+            with open(file_path, 'r+b') as file:
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    # Changed accounts must still be the accounts their rows hold
+                    current = all(data[offset:offset + 5] == record[:5] for offset, record in writes)
+
+                    # Rows no account holds are deleted accounts, invalid lines or tombstones already
+                    tombstones = 0
+                    row = held.find(0)
+                    while row >= 0:
+                        tombstones += 1
+                        if data[row * size:row * size + size - 1] != tombstone:
+                            writes.append((row * size, tombstone))
+                        row = held.find(0, row + 1)
+
+                if current and tombstones <= compact_ratio * (count + len(appends)):
+                    for offset, record in writes:
+                        os.pwrite(file.fileno(), record, offset)
+                    if appends:
+                        if file_size % size:
+                            appends.insert(0, b'\n')
+                        os.pwrite(file.fileno(), b''.join(appends), file_size)
+                    os.fsync(file.fileno())
+                    return len(writes) + len(appends)
+
+        FileIO.write_new_master_accounts(accounts, file_path, cents)
+        return len(accounts)
 
 
+    @staticmethod
+    def _master_rows(accounts, count):
+        """
+        Sorts accounts read from a master of count fixed width records by the record each was read from
+        Returns (mask of rows holding an account, changed accounts, created accounts), or None when an
+        account holds no distinct record of the master
+        """
+        held = bytearray(count)
+        changed = []
+        created = []
+        for acc in accounts:
+            if type(acc) is not Account:
+                return None
+            if acc.offset < 0:
+                created.append(acc)
+                continue
+
+            # Unchanged accounts share the text of the whole master
+            row = acc.offset // 46
+            if row >= count or held[row] or (acc.source is not None and len(acc.source) != count * 46):
+                return None
+            held[row] = 1
+            if acc.source is None:
+                changed.append(acc)
+        return held, changed, created
+
 
     @staticmethod
-    def write_new_master_accounts(accounts, file_path):
+    def write_new_accounts(accounts, master_path, current_path, cents=False):
         """
-        Writes New Master Bank Accounts File with strict format validation.
+        Writes New Master and Current Bank Accounts Files in a single traversal of accounts
+        Sorts accounts like write_new_master_accounts and produces the same two files
+        Raises ValueError for invalid data to enable testing.
+        """
+        FileIO.stream_new_accounts(FileIO.master_order(accounts), master_path, current_path, cents)
+
+
+    @staticmethod
+    def master_order(accounts):
+        """
+        Returns accounts in master file order
+        An AccountStore streams them from its ordered index; a list is sorted in place
+        """
+        if isinstance(accounts, AccountStore):
+            return accounts.ordered()
+        accounts.sort(key=(lambda x: Toolbox.account_key(x['account_number'])))
+        return accounts
+
+
+    @staticmethod
+    def stream_new_accounts(accounts, master_path, current_path, cents=False):
+        """
+        Writes New Master and Current Bank Accounts Files in one pass over accounts
+        Accounts must already be sorted by account number and may be any iterable
+        Each account is validated once and lines are written in large batches
         Raises ValueError for invalid data to enable testing.
         """
-        with open(file_path, 'w') as file:
-            accounts.sort(key=(lambda x: x['account_number']))
+        with FileIO.atomic_open(master_path) as master_file, FileIO.atomic_open(current_path) as current_file:
+            master_lines = []
+            current_lines = []
             for acc in accounts:
-                # Validate account number
-                if not isinstance(acc['account_number'], str) or not acc['account_number'].isdigit():
-                    raise ValueError(f"Invalid account number: {acc['account_number']}")
-                if len(acc['account_number']) > 5:
-                    raise ValueError(f"Account number too long: {acc['account_number']}")
-
-                # Validate name length
-                if len(acc['name']) > 20:
-                    raise ValueError(f"Name exceeds 20 characters: {acc['name']}")
-
-                # Validate status
-                if acc['status'] not in ('A', 'D'):
-                    raise ValueError(f"Invalid status: {acc['status']}")
-
-                # Validate balance
-                if not isinstance(acc['balance'], (int, float)):
-                    raise ValueError(f"Invalid balance type: {type(acc['balance'])}")
-                if acc['balance'] > 99999.99 or acc['balance'] < 0:
-                    raise ValueError(f"Balance out of range: {acc['balance']}")
-
-                # Validate number of transactions
-                if not isinstance(acc['total_transactions'], int):
-                    raise ValueError(f"Invalid transaction count type: {type(acc['total_transactions'])}")
-                if acc['total_transactions'] > 9999 or acc['total_transactions'] < 0:
-                    raise ValueError(f"Transaction count out of range: {acc['total_transactions']}")
-
-                # Validate status
-                if acc['plan'] not in ("NP", "SP"):
-                    raise ValueError(f"Invalid plan: {acc['plan']}")
-
-                # Format fields
-                acc_num = acc['account_number'].zfill(5)
-                name = acc['name'].ljust(20)[:20]
-                balance = f"{acc['balance']:08.2f}"
-                tot_tr = str(acc['total_transactions']).zfill(4)
-
-                file.write(f"{acc_num} {name} {acc['status']} {balance} {tot_tr} {acc['plan']}\n")
+                record = FileIO.format_master_account(acc, cents)
+                master_lines.append(record)
+                current_lines.append(''.join([record[start:stop] for start, stop in FileIO.CURRENT_RANGES]))
+
+                if len(master_lines) >= FileIO.WRITE_BATCH_LINES:
+                    master_file.write(''.join(master_lines))
+                    current_file.write(''.join(current_lines))
+                    master_lines.clear()
+                    current_lines.clear()
+
+            # Add END_OF_FILE marker
+            current_lines.append(FileIO.CURRENT_ACCOUNTS_END)
+            master_file.write(''.join(master_lines))
+            current_file.write(''.join(current_lines))
+
+
+    @staticmethod
+    def reload_accounts(accounts, cents=False):
+        """
+        Returns accounts sorted and normalised exactly as they would be read back from a master file written
+        from them, so consecutive days can be applied without writing and reading the master in between
+        Raises ValueError for invalid data like write_new_master_accounts.
+        """
+        reloaded = []
+        for acc in FileIO.master_order(accounts):
+            # Unchanged accounts still hold exactly what their master record reads back as
+            if getattr(acc, 'source', None) is not None:
+                reloaded.append(acc)
+                continue
+            record = FileIO.format_master_account(acc, cents)
+            values = FileIO.MASTER_RECORD.parse(record[:-1], cents)
+            reloaded.append(Account(*values, record, 0))
+        return reloaded
+
+
+    @staticmethod
+    @contextmanager
+    def atomic_open(file_path, mode='w'):
+        """
+        Opens a temporary file beside file_path for writing and renames it over file_path once the with
+        block completes, so file_path is never left partly written. The temporary file is removed if the
+        block raises, leaving file_path as it was. The directory is synced after the rename so the rename
+        itself survives a crash.
+        """
+        temp_path = f"{file_path}.tmp"
+        file = open(temp_path, mode)
+        try:
+            with file:
+                yield file
+                file.flush()
+                os.fsync(file.fileno())
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        os.replace(temp_path, file_path)
+        directory = os.open(os.path.dirname(os.path.abspath(file_path)), os.O_RDONLY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+
+
+    @staticmethod
+    def truncate_torn_line(file_path):
+        """
+        Truncates file_path after its last newline, dropping a final line torn by an interrupted append
+        Returns number of complete lines kept
+        """
+        lines = 0
+        end = 0
+        with open(file_path, 'r+b') as file:
+            for chunk in iter(lambda: file.read(1 << 20), b''):
+                count = chunk.count(b'\n')
+                if count:
+                    lines += count
+                    end = file.tell() - len(chunk) + chunk.rindex(b'\n') + 1
+            if file.tell() > end:
+                file.truncate(end)
+                file.flush()
+                os.fsync(file.fileno())
+        return lines
+
+
+    @staticmethod
+    def format_current_account(acc, cents=False):
+        """
+        Validates account and formats it as a Current Bank Accounts File line
+        Balance is read as integer cents when cents is set
+        Raises ValueError for invalid data
+        """
+        source = getattr(acc, 'source', None)
+        if source is not None:
+            return ''.join([source[acc.offset + start:acc.offset + stop] for start, stop in FileIO.CURRENT_RANGES])
+        return FileIO.CURRENT_RECORD.format(acc, cents)
+
+
+    @staticmethod
+    def format_master_account(acc, cents=False):
+        """
+        Validates account and formats it as a Master Bank Accounts File line
+        Balance is read as integer cents when cents is set
+        Raises ValueError for invalid data
+        """
+        # Unchanged accounts read from a master file are copied from their record
+        source = getattr(acc, 'source', None)
+        if source is not None:
+            return source[acc.offset:acc.offset + 46]
+        return FileIO.MASTER_RECORD.format(acc, cents)
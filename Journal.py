@@ -0,0 +1,100 @@
+import json
+import os
+import pickle
+
+from FileIO import FileIO
+
+class Journal:
+    """
+    Write-ahead journal of applied transaction log lines with periodic checkpoints of account state
+    Lets an interrupted commit resume from its last checkpoint instead of the first log line
+    """
+
+    def __init__(self, file_path, inputs, cents=False):
+        self.file_path = file_path
+        self.checkpoint_path = f"{file_path}.checkpoint"
+        # Journals only apply to the exact input files and balance representation they were started on
+        self.identity = {
+            'inputs': [[str(path), os.stat(path).st_size, os.stat(path).st_mtime_ns] for path in inputs],
+            'cents': cents,
+        }
+        self._file = None
+        self._resumable = False
+
+    def recover(self):
+        """
+        Reads state left by an interrupted run over the same inputs
+        Returns (accounts, checkpoint line, journaled line); accounts is None when there is no usable
+        checkpoint, in which case the run restarts from the first line of the log
+        """
+        journaled = 0
+        try:
+            with open(self.file_path) as file:
+                header = file.readline()
+                if not header.endswith("\n") or json.loads(header) != self.identity:
+                    return None, 0, 0
+                for line in file:
+                    # A line torn by the interruption has no newline and is ignored
+                    if line.endswith("\n") and line[:-1].isdigit():
+                        journaled = int(line)
+        except (FileNotFoundError, ValueError):
+            return None, 0, 0
+        self._resumable = True
+
+        try:
+            with open(self.checkpoint_path, 'rb') as file:
+                identity, line_num, accounts = pickle.load(file)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return None, 0, journaled
+        if identity != self.identity:
+            return None, 0, journaled
+        return accounts, line_num, journaled
+
+    def begin(self):
+        """
+        Opens the journal for appending, replacing any journal that recover could not use
+        A line torn by the interruption is dropped so the next record starts on a line of its own
+        """
+        if self._resumable:
+            FileIO.truncate_torn_line(self.file_path)
+            self._file = open(self.file_path, 'a')
+            return
+        self._file = open(self.file_path, 'w')
+        self._file.write(json.dumps(self.identity) + "\n")
+        self._sync(self._file)
+
+    def record(self, line_num):
+        """
+        Durably records that every log line up to line_num has been applied and its errors reported
+        """
+        self._file.write(f"{line_num}\n")
+        self._sync(self._file)
+
+    def checkpoint(self, accounts, line_num):
+        """
+        Atomically replaces the checkpoint with accounts as they stand after applying line_num
+        """
+        temp_path = f"{self.checkpoint_path}.tmp"
+        with open(temp_path, 'wb') as file:
+            pickle.dump((self.identity, line_num, list(accounts)), file, pickle.HIGHEST_PROTOCOL)
+            self._sync(file)
+        os.replace(temp_path, self.checkpoint_path)
+
+    def complete(self):
+        """
+        Closes and removes the journal and checkpoint once the run's outputs are written
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        for path in (self.checkpoint_path, self.file_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    @staticmethod
+    def _sync(file):
+        """
+        Flushes file through to disk
+        """
+        file.flush()
+        os.fsync(file.fileno())
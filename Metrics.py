@@ -0,0 +1,188 @@
+import json
+import os
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+try:
+    import resource
+except ImportError:  # Peak RSS is not reported where the resource module is unavailable
+    resource = None
+
+class Metrics:
+    """
+    Opt-in collector of per phase timings, per transaction code costs, rejections and peak memory
+    Active while used as a context manager; when inactive every hook reduces to a None check
+    """
+
+    # Collector the hooks report to, if any
+    active = None
+
+    def __init__(self):
+        self.phases = {}
+        self.codes = {}
+        self.rejections = Counter()
+        self._previous = None
+
+    def __enter__(self):
+        self._previous = Metrics.active
+        Metrics.active = self
+        return self
+
+    def __exit__(self, *exc_info):
+        Metrics.active = self._previous
+
+    @staticmethod
+    def phase(name):
+        """
+        Returns context manager timing a phase on the active collector, or one doing nothing
+        """
+        if Metrics.active is None:
+            return nullcontext()
+        return Metrics.active._time_phase(name)
+
+    @staticmethod
+    @contextmanager
+    def suspended():
+        """
+        Suspends the active collector within the with block
+        """
+        previous, Metrics.active = Metrics.active, None
+        try:
+            yield
+        finally:
+            Metrics.active = previous
+
+    @staticmethod
+    def add_records(name, records):
+        """
+        Adds records processed by a phase on the active collector
+        """
+        if Metrics.active is not None:
+            Metrics.active._phase_totals(name)['records'] += records
+
+    @contextmanager
+    def _time_phase(self, name):
+        """
+        Adds wall and CPU time of the with block to given phase
+        """
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            totals = self._phase_totals(name)
+            totals['wall_seconds'] += time.perf_counter() - wall
+            totals['cpu_seconds'] += time.process_time() - cpu
+
+    def timed(self, name, iterator):
+        """
+        Yields from iterator, adding the time spent producing each item and the item count to given phase
+        """
+        totals = self._phase_totals(name)
+        iterator = iter(iterator)
+        while True:
+            wall, cpu = time.perf_counter(), time.process_time()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                totals['wall_seconds'] += time.perf_counter() - wall
+                totals['cpu_seconds'] += time.process_time() - cpu
+            totals['records'] += 1
+            yield item
+
+    def add_code(self, code, count, seconds):
+        """
+        Adds applied transactions and the time taken to given transaction code
+        """
+        totals = self.codes.setdefault(code, [0, 0.0])
+        totals[0] += count
+        totals[1] += seconds
+
+    def _phase_totals(self, name):
+        """
+        Returns running totals of given phase
+        """
+        if name not in self.phases:
+            self.phases[name] = {'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'records': 0}
+        return self.phases[name]
+
+    @staticmethod
+    def peak_rss():
+        """
+        Returns peak resident set size of this process in bytes, or None if unknown
+        """
+        if resource is None:
+            return None
+        # Linux reports kilobytes, macOS bytes
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if os.uname().sysname == 'Darwin' else peak * 1024
+
+    def summary(self):
+        """
+        Returns collected metrics as a JSON serialisable dict
+        """
+        phases = {}
+        for name, totals in self.phases.items():
+            phases[name] = dict(totals)
+            if totals['records'] and totals['wall_seconds']:
+                phases[name]['records_per_second'] = totals['records'] / totals['wall_seconds']
+        return {
+            'phases': phases,
+            'transaction_codes': {f"{code:02d}": {'count': count, 'seconds': seconds}
+                                  for code, (count, seconds) in sorted(self.codes.items())},
+            'rejections': dict(self.rejections),
+            'peak_rss_bytes': Metrics.peak_rss(),
+        }
+
+    def write_json(self, file_path):
+        """
+        Writes collected metrics as a JSON file
+        """
+        Metrics._write_atomic(file_path, json.dumps(self.summary(), indent=2) + "\n")
+
+    def write_prometheus(self, file_path):
+        """
+        Writes collected metrics in the Prometheus text exposition format for a textfile collector
+        """
+        summary = self.summary()
+        lines = []
+
+        def gauge(metric, description, samples):
+            lines.append(f"# HELP {metric} {description}")
+            lines.append(f"# TYPE {metric} gauge")
+            for labels, value in samples:
+                lines.append(f"{metric}{labels} {value}")
+
+        def label(name, value):
+            escaped = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+            return f'{{{name}="{escaped}"}}'
+
+        phases = summary['phases']
+        gauge("bank_phase_wall_seconds", "Wall time spent in a back end phase",
+              [(label('phase', name), totals['wall_seconds']) for name, totals in phases.items()])
+        gauge("bank_phase_cpu_seconds", "CPU time spent in a back end phase",
+              [(label('phase', name), totals['cpu_seconds']) for name, totals in phases.items()])
+        gauge("bank_phase_records", "Records processed by a back end phase",
+              [(label('phase', name), totals['records']) for name, totals in phases.items()])
+        gauge("bank_transactions", "Transactions applied per transaction code",
+              [(label('code', code), totals['count']) for code, totals in summary['transaction_codes'].items()])
+        gauge("bank_transaction_seconds", "Time spent applying transactions per transaction code",
+              [(label('code', code), totals['seconds']) for code, totals in summary['transaction_codes'].items()])
+        gauge("bank_rejections", "Errors reported per constraint type",
+              [(label('type', name), count) for name, count in summary['rejections'].items()])
+        if summary['peak_rss_bytes'] is not None:
+            gauge("bank_peak_rss_bytes", "Peak resident set size of the back end", [("", summary['peak_rss_bytes'])])
+
+        Metrics._write_atomic(file_path, "\n".join(lines) + "\n")
+
+    @staticmethod
+    def _write_atomic(file_path, content):
+        """
+        Writes content through FileIO.atomic_open so readers never see a partial file
+        """
+        # Imported here as FileIO itself imports Metrics
+        from FileIO import FileIO
+        with FileIO.atomic_open(file_path) as file:
+            file.write(content)
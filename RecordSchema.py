@@ -0,0 +1,280 @@
+import re
+
+from Toolbox import Toolbox
+
+class Field:
+    """
+    A fixed width field of a record schema
+    Kinds are 'number' (zero padded account number, read without its leading zeros), 'count'
+    (zero padded integer), 'amount' (XXXXX.XX money), 'choice' (one of values), 'text' (space
+    padded, read stripped) and 'raw' (read and written as is)
+    Error messages default to wording built from label and may be overridden; read messages may
+    refer to the raw text of any field of the record by name and to this field's as {raw}
+    """
+
+    def __init__(self, name, start, width, kind, label=None, values=None, low=None, high=None,
+                 invalid=None, out_of_range=None):
+        self.name = name
+        self.start = start
+        self.width = width
+        self.stop = start + width
+        self.kind = kind
+        self.label = label or name.replace('_', ' ')
+        # Choices map each allowed text to the shared string accounts hold
+        self.values = values if isinstance(values, dict) or values is None else {value: value for value in values}
+        self.low = low
+        self.high = high
+
+        if kind == 'choice':
+            self.invalid = invalid or f"Invalid {self.label} '{{raw}}'"
+        else:
+            self.invalid = invalid or f"Invalid {self.label} format"
+        self.out_of_range = out_of_range or f"Negative {self.label}"
+
+    def pattern(self):
+        """
+        Returns regular expression matching the field's text when it is well formed
+        """
+        if self.kind in ('number', 'count'):
+            return f"[0-9]{{{self.width}}}"
+        if self.kind == 'amount':
+            return f"[0-9]{{{self.width - 3}}}\\.[0-9]{{2}}"
+        if self.kind == 'choice':
+            return "(?:" + "|".join(re.escape(value) for value in self.values) + ")"
+        return f".{{{self.width}}}"
+
+    def bounds(self, cents):
+        """
+        Returns (low, high) limits of the field's values, None where unlimited
+        Amount limits are declared in currency units and returned as integer cents when cents is set
+        """
+        if self.kind == 'amount' and cents:
+            return tuple(None if bound is None else round(bound * 100) for bound in (self.low, self.high))
+        return self.low, self.high
+
+    def needs_range_check(self, cents):
+        """
+        Returns whether read values can fall outside the field's limits, which well formed text alone rules out
+        """
+        low, high = self.bounds(cents)
+        if self.kind == 'count':
+            largest = 10 ** self.width - 1
+        elif self.kind == 'amount':
+            largest = (10 ** (self.width - 1) - 1) / (1 if cents else 100)
+        else:
+            return False
+        return (low is not None and low > 0) or (high is not None and high < largest)
+
+    def read_expression(self, text, values, cents):
+        """
+        Returns Python expression converting the well formed field text in variable text to its value,
+        choices being looked up in the mapping in variable values
+        """
+        if self.kind == 'number':
+            return f"({text}.lstrip('0') or '0')"
+        if self.kind == 'count':
+            return f"int({text})"
+        if self.kind == 'amount':
+            return f"parse_cents({text})" if cents else f"float({text})"
+        if self.kind == 'choice':
+            return f"{values}[{text}]"
+        if self.kind == 'text':
+            return f"{text}.strip()"
+        return text
+
+    def write_statements(self, value, text, values, cents):
+        """
+        Returns Python statements validating the field value in variable value and setting variable text
+        to its formatted text, choices being checked against the mapping in variable values
+        The statements raise ValueError for invalid data
+        """
+        label = self.label[0].upper() + self.label[1:]
+        width = self.width
+        if self.kind == 'number':
+            return [f"if not isinstance({value}, str) or not {value}.isdigit():",
+                    f"    raise ValueError({f'Invalid {self.label}: '!r} + str({value}))",
+                    f"if len({value}) > {width}:",
+                    f"    raise ValueError({f'{label} too long: '!r} + {value})",
+                    f"{text} = {value}.zfill({width})"]
+        if self.kind == 'text':
+            return [f"if len({value}) > {width}:",
+                    f"    raise ValueError({f'{label} exceeds {width} characters: '!r} + str({value}))",
+                    f"{text} = {value}.ljust({width})[:{width}]"]
+        if self.kind == 'choice':
+            return [f"if {value} not in {values}:",
+                    f"    raise ValueError({f'Invalid {self.label}: '!r} + str({value}))",
+                    f"{text} = {value}"]
+        if self.kind in ('amount', 'count'):
+            types = 'int' if cents or self.kind == 'count' else '(int, float)'
+            low, high = self.bounds(cents)
+            limits = ([f"{value} > {high!r}"] if high is not None else []) + \
+                     ([f"{value} < {low!r}"] if low is not None else [])
+            statements = [f"if not isinstance({value}, {types}):",
+                          f"    raise ValueError({f'Invalid {self.label} type: '!r} + str(type({value})))"]
+            if limits:
+                statements += [f"if {' or '.join(limits)}:",
+                               f"    raise ValueError({f'{label} out of range: '!r} + str({value}))"]
+            if self.kind == 'count':
+                return statements + [f"{text} = str({value}).zfill({width})"]
+            if cents:
+                return statements + [f"{text} = '%0{width - 3}d.%02d' % divmod({value}, 100)"]
+            return statements + [f"{text} = format({value}, '0{width}.2f')"]
+        return [f"{text} = {value}"]
+
+
+class RecordSchema:
+    """
+    A fixed width line record declared as fields in column order, the columns between them being separators
+    Compiles into a parser validating a whole line with one regular expression match, so a well formed line
+    costs a single match and one conversion per field, and into a formatter writing fields back with space
+    separators. Both are generated as Python functions once per balance representation.
+    """
+
+    def __init__(self, fields, length):
+        self.fields = fields
+        self.length = length
+        self.names = tuple(field.name for field in fields)
+        self.separators = [column for field, stop in zip(fields, [field.start for field in fields[1:]] + [length])
+                           for column in range(field.stop, stop)]
+
+        parts = []
+        position = 0
+        for field in fields:
+            parts.append(f".{{{field.start - position}}}{field.pattern()}")
+            position = field.stop
+        parts.append(f".{{{length - position}}}")
+        self._regex = re.compile("".join(parts), re.DOTALL)
+
+        self._parsers = {cents: self._compile_parser(cents) for cents in (False, True)}
+        self._formatters = {cents: self._compile_formatter(cents) for cents in (False, True)}
+        self._plain = self._compile_plain()
+
+    def parse(self, line, cents=False):
+        """
+        Validates a record line without its newline and converts its fields
+        Returns field values in schema order
+        Raises ValueError with the message of the first check failing, checked in the order the
+        hand written readers used: length, then each field's format, then each field's range
+        """
+        return self._parsers[cents](line)
+
+    def is_plain(self, line, values):
+        """
+        Returns whether format would write a parsed line back unchanged from its values
+        """
+        return self._plain(line, values)
+
+    def format(self, record, cents=False):
+        """
+        Validates a record's fields, read by name, and formats them as a line with its newline
+        Raises ValueError for invalid data
+        """
+        return self._formatters[cents](record)
+
+    def ranges(self, target):
+        """
+        Returns (start, stop) column ranges of a plain newline terminated record of this schema
+        that concatenate into the line target would format from the same values
+        Raises ValueError when target has fields or separators this schema cannot supply
+        """
+        fields = {field.name: (field, previous_stop)
+                  for field, previous_stop in zip(self.fields, [0] + [field.stop for field in self.fields])}
+        ranges = []
+        position = 0
+        for field in target.fields + [None]:
+            if field is None:
+                # The newline, preceded by any trailing separator
+                start, stop = self.length - (target.length - position), self.length + 1
+                if start < self.fields[-1].stop:
+                    raise ValueError("Trailing separator has no counterpart")
+            else:
+                source, previous_stop = fields[field.name]
+                if (source.kind, source.width) != (field.kind, field.width):
+                    raise ValueError(f"Field {field.name} differs between record schemas")
+                start, stop = source.start - (field.start - position), source.stop
+                if start < previous_stop:
+                    raise ValueError(f"Separator before field {field.name} has no counterpart")
+                position = field.stop
+
+            if ranges and ranges[-1][1] == start:
+                ranges[-1] = (ranges[-1][0], stop)
+            else:
+                ranges.append((start, stop))
+        return ranges
+
+    def _compile_parser(self, cents):
+        """
+        Returns generated function parsing a line into field values
+        """
+        lines = ["def parse(line):",
+                 "    if match(line) is None:",
+                 "        raise ValueError(diagnose(line))"]
+        values = ", ".join(field.read_expression(f"line[{field.start}:{field.stop}]", f"values_{index}", cents)
+                           for index, field in enumerate(self.fields))
+        lines.append(f"    values = [{values}]")
+        for index, field in enumerate(self.fields):
+            if field.needs_range_check(cents):
+                low, high = field.bounds(cents)
+                limits = ([f"values[{index}] < {low!r}"] if low is not None else []) + \
+                         ([f"values[{index}] > {high!r}"] if high is not None else [])
+                lines += [f"    if {' or '.join(limits)}:",
+                          f"        raise ValueError(range_error({index}, line))"]
+        lines.append("    return values")
+        return self._define(lines, 'parse', match=self._regex.fullmatch, diagnose=self._diagnose,
+                            range_error=self._range_error, parse_cents=Toolbox.parse_cents)
+
+    def _compile_formatter(self, cents):
+        """
+        Returns generated function formatting a record as a line
+        """
+        lines = ["def format_record(record):"]
+        line = ""
+        position = 0
+        for index, field in enumerate(self.fields):
+            lines.append(f"    value_{index} = record[{field.name!r}]")
+            lines += ["    " + statement for statement
+                      in field.write_statements(f"value_{index}", f"text_{index}", f"values_{index}", cents)]
+            line += " " * (field.start - position) + f"{{text_{index}}}"
+            position = field.stop
+        line += " " * (self.length - position) + "\\n"
+        lines.append(f"    return f\"{line}\"")
+        return self._define(lines, 'format_record')
+
+    def _compile_plain(self):
+        """
+        Returns generated function checking that a parsed line has space separators and padded text fields
+        """
+        checks = [f"line[{column}] == ' '" for column in self.separators]
+        checks += [f"line[{field.start}:{field.stop}] == values[{index}].ljust({field.width})"
+                   for index, field in enumerate(self.fields) if field.kind == 'text']
+        return self._define(["def is_plain(line, values):",
+                             f"    return {' and '.join(checks) or 'True'}"], 'is_plain')
+
+    def _define(self, lines, name, **namespace):
+        """
+        Executes generated function source with the choice mappings and given names in scope
+        Returns the defined function
+        """
+        namespace.update({f"values_{index}": field.values for index, field in enumerate(self.fields)})
+        exec("\n".join(lines), namespace)
+        return namespace[name]
+
+    def _range_error(self, index, line):
+        """
+        Returns error message for a well formed line whose field at index is out of range
+        """
+        raw = {field.name: line[field.start:field.stop] for field in self.fields}
+        field = self.fields[index]
+        return field.out_of_range.format(raw=raw[field.name], **raw)
+
+    def _diagnose(self, line):
+        """
+        Returns error message for a line the compiled expression rejected
+        """
+        if len(line) != self.length:
+            return f"Invalid length ({len(line)} chars)"
+        raw = {field.name: line[field.start:field.stop] for field in self.fields}
+        for field in self.fields:
+            if not re.fullmatch(field.pattern(), raw[field.name], re.DOTALL):
+                return field.invalid.format(raw=raw[field.name], **raw)
+        return "Invalid record"
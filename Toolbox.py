@@ -1,17 +1,58 @@
+from AccountStore import AccountStore
+from ErrorSink import ErrorSink
+from Metrics import Metrics
+
 class Toolbox:
     """
     A toolbox class with useful miscellaneous functions
     """
 
+    # Optional ErrorSink receiving errors in place of printing
+    error_sink = None
+
+    # Transaction being applied, attached to errors recorded by structured sinks
+    error_context = None
+
     # //// STARTER CODE: DO NOT ALTER ////
     @staticmethod
     def log_constraint_error(constraint_type, description):
         """
         Prints an error message for failed constraints in the required format
         """
+        if Metrics.active is not None:
+            Metrics.active.rejections[constraint_type] += 1
+        if Toolbox.error_sink is not None:
+            Toolbox.error_sink.record(constraint_type, description, Toolbox.error_context)
+            return
         print(f"ERROR: {constraint_type}: {description}")
 
 
+    @staticmethod
+    def log_fatal_error(line_num, description):
+        """
+        Prints an error message for an invalid input file line in the required format
+        """
+        if Metrics.active is not None:
+            Metrics.active.rejections[ErrorSink.FATAL] += 1
+        if Toolbox.error_sink is not None:
+            Toolbox.error_sink.record(ErrorSink.FATAL, description, line_number=line_num)
+            return
+        print(f"ERROR: Fatal error - Line {line_num}: {description}")
+
+
+    @staticmethod
+    def log_error_record(record):
+        """
+        Reports an error already captured as an ErrorRecord
+        """
+        if Metrics.active is not None:
+            Metrics.active.rejections[record.constraint_type] += 1
+        if Toolbox.error_sink is not None:
+            Toolbox.error_sink.add(record)
+            return
+        print(ErrorSink.format(record))
+
+
     @staticmethod
     def decode_tc(transaction_code):
         """
@@ -46,7 +87,54 @@ class Toolbox:
         Searches for account that matches transaction
         Returns account or None if account does not exist
         """
+        # Indexed stores answer directly instead of scanning every account
+        if isinstance(accounts, AccountStore):
+            return accounts.get(transaction['account_number'])
+
         for account in accounts:
             if account['account_number'] == transaction['account_number']:
                 return account
-        return None
\ No newline at end of file
+        return None
+
+
+    @staticmethod
+    def is_holder(accounts, account, name):
+        """
+        Returns whether given name, compared normalised, is the holder of account
+        """
+        # Indexed stores answer from their name index
+        if isinstance(accounts, AccountStore):
+            return accounts.is_holder(account['account_number'], name)
+        return AccountStore.normalize_name(account['name']) == AccountStore.normalize_name(name)
+
+
+    @staticmethod
+    def account_key(account_number):
+        """
+        Returns sort key placing account numbers in master file order
+        """
+        return int(account_number)
+
+
+    @staticmethod
+    def format_amount(amount):
+        """
+        Formats dollar amount for messages
+        """
+        return f"{amount:.2f}"
+
+
+    @staticmethod
+    def parse_cents(amount_str):
+        """
+        Converts validated XXXXX.XX amount string into integer cents
+        """
+        return int(amount_str.replace('.', ''))
+
+
+    @staticmethod
+    def format_cents(cents):
+        """
+        Formats integer cents for messages like format_amount does for dollars
+        """
+        return "%d.%02d" % divmod(cents, 100)
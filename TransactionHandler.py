@@ -1,3 +1,17 @@
+import heapq
+import os
+import time
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from functools import partial
+from itertools import accumulate, groupby
+from multiprocessing import Pool
+from operator import itemgetter
+
+from Account import Account
+from AccountStore import AccountStore
+from ErrorSink import CollectingSink, SequencedSink
+from Metrics import Metrics
 from Toolbox import Toolbox
 
 class TransactionHandler:
@@ -5,8 +19,33 @@ class TransactionHandler:
     Handles the application of transactions to account data
     """
 
-    @staticmethod
-    def withdraw(accounts, transaction):
+    # Largest balance an account may hold
+    BALANCE_LIMIT = 99999.99
+
+    # Codes of transactions moving money into or out of their account, coalesced into runs per account
+    MONETARY_CODES = frozenset((1, 2, 3, 4))
+
+    # Messages of rejected monetary transactions by constraint type and code, formatted with amount and account number
+    MONETARY_MESSAGES = {
+        ("Account Disabled", 1): "Cannot withdraw from disabled account {1}",
+        ("Account Disabled", 2): "Cannot transfer involving disabled account",
+        ("Account Disabled", 3): "Cannot pay bills from disabled account {1}",
+        ("Account Disabled", 4): "Cannot deposit into disabled account {1}",
+        ("Insufficient Funds", 1): "Cannot withdraw {0} from account {1}",
+        ("Insufficient Funds", 2): "Cannot transfer {0} from account {1}",
+        ("Insufficient Funds", 3): "Cannot pay bill of {0} from account {1}",
+        ("Balance Limit Exceeded", 2): "Cannot deposit {0} into account {1}",
+        ("Balance Limit Exceeded", 4): "Cannot deposit {0} into account {1}",
+    }
+
+    # Transactions in the first prefix sum block of a monetary run, doubled after each block without rejections
+    COALESCE_BLOCK = 16
+
+    # Formats amounts in constraint error messages
+    format_amount = staticmethod(Toolbox.format_amount)
+
+    @classmethod
+    def withdraw(cls, accounts, transaction):
         """
         Applies withdraw transaction to related account
         """
@@ -16,18 +55,18 @@ class TransactionHandler:
             return
 
         if account['status'] == 'D':
-            Toolbox.log_constraint_error("Account Disabled", f"Cannot withdraw from disabled account {account['account_number']}")
+            cls._reject("Account Disabled", account, transaction)
             return
 
         if transaction['amount'] > account['balance']:
-            Toolbox.log_constraint_error("Insufficient Funds", f"Cannot withdraw {transaction['amount']:.2f} from account {account['account_number']}")
+            cls._reject("Insufficient Funds", account, transaction)
             return
 
         account['balance'] -= transaction['amount']
         account['total_transactions'] += 1
 
-    @staticmethod
-    def transfer(accounts, transaction):
+    @classmethod
+    def transfer(cls, accounts, transaction):
         """
         Applies transfer transaction to one related account
         """
@@ -41,28 +80,28 @@ class TransactionHandler:
             return
 
         if account['status'] == 'D':
-            Toolbox.log_constraint_error("Account Disabled", "Cannot transfer involving disabled account")
+            cls._reject("Account Disabled", account, transaction)
             return
 
         sending = (transaction['misc'] == "SD")
 
         if sending:
             if transaction['amount'] > account['balance']:
-                Toolbox.log_constraint_error("Insufficient Funds", f"Cannot transfer {transaction['amount']:.2f} from account {account['account_number']}")
+                cls._reject("Insufficient Funds", account, transaction)
                 return
 
             account['balance'] -= transaction['amount']
             account['total_transactions'] += 1
         else:
-            if (account['balance'] + transaction['amount']) > 99999.99:
-                Toolbox.log_constraint_error("Balance Limit Exceeded",f"Cannot deposit {transaction['amount']:.2f} into account {account['account_number']}")
+            if (account['balance'] + transaction['amount']) > cls.BALANCE_LIMIT:
+                cls._reject("Balance Limit Exceeded", account, transaction)
                 return
 
             account['balance'] += transaction['amount']
             account['total_transactions'] += 1
 
-    @staticmethod
-    def paybill(accounts, transaction):
+    @classmethod
+    def paybill(cls, accounts, transaction):
         """
         Applies paybill transaction to related account
         """
@@ -72,18 +111,18 @@ class TransactionHandler:
             return
 
         if account['status'] == 'D':
-            Toolbox.log_constraint_error("Account Disabled", f"Cannot pay bills from disabled account {account['account_number']}")
+            cls._reject("Account Disabled", account, transaction)
             return
 
         if transaction['amount'] > account['balance']:
-            Toolbox.log_constraint_error("Insufficient Funds", f"Cannot pay bill of {transaction['amount']:.2f} from account {account['account_number']}")
+            cls._reject("Insufficient Funds", account, transaction)
             return
 
         account['balance'] -= transaction['amount']
         account['total_transactions'] += 1
 
-    @staticmethod
-    def deposit(accounts, transaction):
+    @classmethod
+    def deposit(cls, accounts, transaction):
         """
         Applies deposit transaction to related account
         """
@@ -93,18 +132,18 @@ class TransactionHandler:
             return
 
         if account['status'] == 'D':
-            Toolbox.log_constraint_error("Account Disabled", f"Cannot deposit into disabled account {account['account_number']}")
+            cls._reject("Account Disabled", account, transaction)
             return
 
-        if (account['balance'] + transaction['amount']) > 99999.99:
-            Toolbox.log_constraint_error("Balance Limit Exceeded", f"Cannot deposit {transaction['amount']:.2f} into account {account['account_number']}")
+        if (account['balance'] + transaction['amount']) > cls.BALANCE_LIMIT:
+            cls._reject("Balance Limit Exceeded", account, transaction)
             return
 
         account['balance'] += transaction['amount']
         account['total_transactions'] += 1
 
-    @staticmethod
-    def create(accounts, transaction):
+    @classmethod
+    def create(cls, accounts, transaction):
         """
         Applies create transaction to related account
         """
@@ -117,19 +156,19 @@ class TransactionHandler:
             Toolbox.log_constraint_error("Invalid Code", f"{transaction['misc']} is not a valid plan")
             return
 
-        new_account = {
-            'account_number': transaction['account_number'],
-            'name': transaction['name'],
-            'status': 'A',  # Active by default
-            'balance': transaction['amount'],
-            'total_transactions': 0,
-            'plan': transaction['misc']  # Regular or Student plan
-    }
+        new_account = Account(
+            transaction['account_number'],
+            transaction['name'],
+            'A',  # Active by default
+            transaction['amount'],
+            0,
+            transaction['misc']  # Regular or Student plan
+        )
 
         accounts.append(new_account)
 
-    @staticmethod
-    def delete(accounts, transaction):
+    @classmethod
+    def delete(cls, accounts, transaction):
         """
         Applies delete transaction to related account
         """
@@ -144,8 +183,8 @@ class TransactionHandler:
 
         accounts.remove(account)
 
-    @staticmethod
-    def disable(accounts, transaction):
+    @classmethod
+    def disable(cls, accounts, transaction):
         """
         Applies disable transaction to related account
         """
@@ -164,8 +203,8 @@ class TransactionHandler:
 
         account['status'] = transaction['misc'].strip()
 
-    @staticmethod
-    def changeplan(accounts, transaction):
+    @classmethod
+    def changeplan(cls, accounts, transaction):
         """
         Applies changeplan transaction to related account
         """
@@ -188,16 +227,345 @@ class TransactionHandler:
 
         account['plan'] = transaction['misc']
 
-    @staticmethod
-    def apply(accounts, transactions):
+    @classmethod
+    def apply(cls, accounts, transactions, check_names=False):
         """
         Applies list of transactions to given account list
+        Transactions naming someone other than the account holder are rejected when check_names is set
         """
-        for transaction in transactions:
-            transaction_function = Toolbox.decode_tc(transaction['transaction_code'])
+        plan = cls.compile(transactions)
+        if check_names:
+            plan = cls._check_names(accounts, plan)
+
+        metrics = Metrics.active
+        if metrics is not None:
+            # Instrumented copy of the loop below, timing each run against its transaction codes
+            # Monetary runs mixing codes share their time among them by transaction count
+            for transaction_function, run in plan:
+                start = time.perf_counter()
+                transaction_function(accounts, run)
+                elapsed = time.perf_counter() - start
+                for code, count in Counter(map(itemgetter('transaction_code'), run)).items():
+                    metrics.add_code(code, count, elapsed * count / len(run))
+            return
+
+        for transaction_function, run in plan:
+            transaction_function(accounts, run)
 
-            # Do nothing if transaction is end of session
-            if not transaction_function:
+    @classmethod
+    def compile(cls, transactions):
+        """
+        Compiles transactions into a plan of (run function, run of transactions) steps
+        Codes are resolved once through the dispatch table, end of session records are dropped
+        and consecutive transactions sharing a code and account form a single run, withdraw,
+        transfer, paybill and deposit transactions forming one monetary run whatever their codes
+        """
+        table = cls._dispatch_table()
+        monetary = cls.MONETARY_CODES
+        def kind(transaction):
+            code = transaction['transaction_code']
+            return -1 if code in monetary else code
+
+        for _, group in groupby(transactions, key=itemgetter('account_number')):
+            group = list(group)
+            if len(group) == 1:
+                runs = (group,)
+            elif monetary.issuperset(map(itemgetter('transaction_code'), group)):
+                yield cls._monetary_run, group
                 continue
+            else:
+                # Other codes split the account's transactions, only running with their own code
+                runs = [list(run) for _, run in groupby(group, key=kind)]
+
+            for run in runs:
+                code = run[0]['transaction_code']
+                run_function = cls._monetary_run if len(run) > 1 and code in monetary else table.get(code)
 
+                # Do nothing if transaction is end of session
+                if run_function is None:
+                    continue
+
+                yield run_function, run
+
+    @classmethod
+    def _check_names(cls, accounts, plan):
+        """
+        Splits plan runs around transactions whose name is not the account holder's, reporting those instead
+        Names are checked against accounts as they stand when the run is reached; creates are not checked
+        and transactions for missing accounts are left for their handler to report.
+        Monetary runs cannot change an account's holder and are checked as a whole, while runs of other
+        codes, which may delete the account, are checked and applied one transaction at a time.
+        """
+        for transaction_function, run in plan:
+            code = run[0]['transaction_code']
+            if code == 5:
+                yield transaction_function, run
+            elif code in cls.MONETARY_CODES or len(run) == 1:
+                yield from cls._check_run(accounts, transaction_function, run)
+            else:
+                for transaction in run:
+                    yield from cls._check_run(accounts, transaction_function, [transaction])
+
+    @staticmethod
+    def _check_run(accounts, transaction_function, run):
+        """
+        Checks names of one plan run against its account, yielding the steps left to apply
+        """
+        account = Toolbox.search_account(accounts, run[0])
+        if account is None:
+            yield transaction_function, run
+            return
+
+        start = 0
+        for position, transaction in enumerate(run):
+            if Toolbox.is_holder(accounts, account, transaction['name']):
+                continue
+            if position > start:
+                yield transaction_function, run[start:position]
+            Toolbox.error_context = transaction
+            Toolbox.log_constraint_error("Name Mismatch", f"{transaction['name']} is not the holder of account {account['account_number']}")
+            start = position + 1
+        if start < len(run):
+            yield transaction_function, run[start:] if start else run
+
+    @classmethod
+    def _dispatch_table(cls):
+        """
+        Returns table from transaction code to the function applying a run of that code one transaction
+        at a time, built once per class
+        """
+        table = cls.__dict__.get('_dispatch')
+        if table is None:
+            table = {
+                1: partial(cls._apply_each, cls.withdraw),
+                2: partial(cls._apply_each, cls.transfer),
+                3: partial(cls._apply_each, cls.paybill),
+                4: partial(cls._apply_each, cls.deposit),
+                5: partial(cls._apply_each, cls.create),
+                6: partial(cls._apply_each, cls.delete),
+                7: partial(cls._apply_each, cls.disable),
+                8: partial(cls._apply_each, cls.changeplan),
+            }
+            cls._dispatch = table
+        return table
+
+    @staticmethod
+    def _apply_each(transaction_function, accounts, transactions):
+        """
+        Applies run of transactions one at a time through given transaction function
+        """
+        for transaction in transactions:
+            Toolbox.error_context = transaction
             transaction_function(accounts, transaction)
+
+    @classmethod
+    def _monetary_run(cls, accounts, transactions):
+        """
+        Applies run of withdraw, transfer, paybill and deposit transactions to one account, equivalent
+        to applying each in turn
+        Running balances are prefix sums of the run's signed amounts, taken a block at a time. A block
+        whose running balances all stay within 0 and the balance limit has nothing rejected and is applied
+        as its net amount; only a block with some rejected transaction, or a run shorter than a block, is
+        stepped through in order.
+        """
+        if len(transactions) == 1:
+            cls._dispatch_table()[transactions[0]['transaction_code']](accounts, transactions)
+            return
+
+        account = Toolbox.search_account(accounts, transactions[0])
+        if not account:
+            for transaction in transactions:
+                Toolbox.error_context = transaction
+                Toolbox.log_constraint_error("Account Not Found", f"Account {transaction['account_number']} does not exist")
+            return
+
+        if account['status'] == 'D':
+            for transaction in transactions:
+                Toolbox.error_context = transaction
+                if transaction['transaction_code'] == 2 and transaction['misc'] not in ("SD", "RV"):
+                    Toolbox.log_constraint_error("Invalid Code", f"{transaction['misc']} is not a valid transfer code")
+                else:
+                    cls._reject("Account Disabled", account, transaction)
+            return
+
+        if len(transactions) < cls.COALESCE_BLOCK:
+            # Too short for prefix sums to pay off
+            balance, applied = cls._step_through(account, transactions, account['balance'])
+        else:
+            balance, applied = cls._coalesce(account, transactions)
+
+        if applied:
+            account['balance'] = balance
+            account['total_transactions'] += applied
+
+    @classmethod
+    def _coalesce(cls, account, transactions):
+        """
+        Applies monetary run to the active account's balance a prefix sum block at a time
+        Returns resulting balance and number of transactions applied
+        """
+        # Signed amounts, and positions of transfers whose code rejects them whatever the balance
+        deltas = [-transaction['amount'] if transaction['transaction_code'] != 4 and
+                  (transaction['transaction_code'] != 2 or transaction['misc'] == "SD") else transaction['amount']
+                  for transaction in transactions]
+        invalid = []
+        if 2 in map(itemgetter('transaction_code'), transactions):
+            invalid = [position for position, transaction in enumerate(transactions)
+                       if transaction['transaction_code'] == 2 and transaction['misc'] not in ("SD", "RV")]
+
+        balance = account['balance']
+        applied = 0
+        size = cls.COALESCE_BLOCK
+        start = 0
+        while start < len(transactions):
+            stop = min(start + size, len(transactions))
+            running = list(accumulate(deltas[start:stop], initial=balance))
+            if min(running) >= 0 and max(running) <= cls.BALANCE_LIMIT and bisect_left(invalid, start) == bisect_left(invalid, stop):
+                # Nothing rejected, try a longer block next
+                balance = running[-1]
+                applied += stop - start
+                size *= 2
+            else:
+                balance, stepped = cls._step_through(account, transactions[start:stop], balance)
+                applied += stepped
+                size = cls.COALESCE_BLOCK
+            start = stop
+        return balance, applied
+
+    @classmethod
+    def _step_through(cls, account, transactions, balance):
+        """
+        Applies monetary transactions to the active account's balance one at a time, reporting those rejected
+        Returns resulting balance and number of transactions applied
+        """
+        limit = cls.BALANCE_LIMIT
+        applied = 0
+        for transaction in transactions:
+            code = transaction['transaction_code']
+            amount = transaction['amount']
+            if code == 2 and transaction['misc'] not in ("SD", "RV"):
+                Toolbox.error_context = transaction
+                Toolbox.log_constraint_error("Invalid Code", f"{transaction['misc']} is not a valid transfer code")
+                continue
+
+            if code != 4 and (code != 2 or transaction['misc'] == "SD"):
+                if amount > balance:
+                    Toolbox.error_context = transaction
+                    cls._reject("Insufficient Funds", account, transaction)
+                    continue
+                balance -= amount
+            else:
+                if (balance + amount) > limit:
+                    Toolbox.error_context = transaction
+                    cls._reject("Balance Limit Exceeded", account, transaction)
+                    continue
+                balance += amount
+            applied += 1
+        return balance, applied
+
+    @classmethod
+    def _reject(cls, constraint_type, account, transaction):
+        """
+        Reports monetary transaction rejected for given constraint type with its message from MONETARY_MESSAGES
+        """
+        message = cls.MONETARY_MESSAGES[constraint_type, transaction['transaction_code']]
+        Toolbox.log_constraint_error(constraint_type, message.format(cls.format_amount(transaction['amount']),
+                                                                     account['account_number']))
+
+    @classmethod
+    def apply_sorted(cls, accounts, transactions):
+        """
+        Merge-joins transactions into accounts where both iterables are sorted by account number
+        Yields resulting accounts in sorted order while holding one account number in memory.
+        Constraint errors are reported grouped by account rather than in log order.
+        Raises ValueError if accounts are not sorted.
+        """
+        key = (lambda x: Toolbox.account_key(x['account_number']))
+        account_groups = groupby(accounts, key)
+        transaction_groups = groupby(transactions, key)
+        account_group = next(account_groups, None)
+        transaction_group = next(transaction_groups, None)
+        previous = None
+
+        while account_group or transaction_group:
+            if account_group and (previous is not None and account_group[0] <= previous):
+                raise ValueError(f"Accounts are not sorted at account {account_group[0]}")
+
+            if transaction_group is None or (account_group and account_group[0] < transaction_group[0]):
+                # Untouched account numbers pass straight through
+                previous = account_group[0]
+                yield from account_group[1]
+                account_group = next(account_groups, None)
+                continue
+
+            group = []
+            if account_group and account_group[0] == transaction_group[0]:
+                group = list(account_group[1])
+                account_group = next(account_groups, None)
+
+            previous = transaction_group[0]
+            cls.apply(group, transaction_group[1])
+            transaction_group = next(transaction_groups, None)
+            yield from group
+
+    @classmethod
+    def apply_parallel(cls, accounts, transactions, processes=None):
+        """
+        Applies transactions across a process pool, sharding accounts into account number ranges
+        Returns AccountStore of resulting accounts sorted by account number.
+        Errors are reported in the order apply reports them once all shards finish.
+        """
+        processes = processes or os.cpu_count() or 1
+        key = (lambda x: Toolbox.account_key(x['account_number']))
+        accounts = sorted(accounts, key=key)
+
+        # Split distinct account numbers into contiguous ranges of similar size
+        keys = sorted({key(account) for account in accounts})
+        step = -(-len(keys) // processes) or 1
+        bounds = keys[step::step]
+
+        shards = [([], []) for _ in range(len(bounds) + 1)]
+        for account in accounts:
+            shards[bisect_right(bounds, key(account))][0].append(account)
+
+        # Fatal errors met while reading are held back to be reported among shard errors where apply reports
+        # them: before the errors of the account's run of transactions being read, as compile reads ahead to
+        # find where each run ends. They are counted when reported.
+        fatal = []
+        run_start = 0
+        previous = None
+        with CollectingSink() as reading, Metrics.suspended():
+            for seq, transaction in enumerate(transactions):
+                if len(reading.records) > len(fatal):
+                    fatal.extend((run_start, record) for record in reading.records[len(fatal):])
+                if transaction['account_number'] != previous:
+                    run_start, previous = seq, transaction['account_number']
+                shards[bisect_right(bounds, key(transaction))][1].append(dict(transaction, seq=seq))
+            fatal.extend((run_start, record) for record in reading.records[len(fatal):])
+
+        if len(shards) == 1:
+            results = [cls._apply_shard(shards[0])]
+        else:
+            with Pool(min(processes, len(shards))) as pool:
+                results = pool.map(cls._apply_shard, shards)
+
+        # Fatal errors go first among errors sharing a seq, like apply reports them before applying the run
+        for _, record in heapq.merge(fatal, *[errors for _, errors in results], key=itemgetter(0)):
+            Toolbox.log_error_record(record)
+
+        return AccountStore(account for shard_accounts, _ in results for account in shard_accounts)
+
+    @classmethod
+    def _apply_shard(cls, shard):
+        """
+        Applies one shard of transactions carrying their seq number in the log to its accounts
+        Returns accounts sorted by account number and the (seq, ErrorRecord) errors raised
+        """
+        accounts, transactions = shard
+        accounts = AccountStore(accounts)
+
+        # Rejections are counted once shard errors are reported again by the parent
+        with SequencedSink() as sink, Metrics.suspended():
+            cls.apply(accounts, transactions)
+
+        return list(accounts.ordered()), list(zip(sink.sequence, sink.records))
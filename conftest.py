@@ -0,0 +1,61 @@
+import random
+import pytest
+from BackEndSystem import BackEndSystem
+from FileIO import FileIO
+
+# Transaction codes paired with the misc field they are logged with
+CODES = [(1, '  '), (2, 'SD'), (2, 'RV'), (3, 'EC'), (4, '  '), (5, 'NP'), (6, '  '), (7, 'D '), (8, 'SP'), (0, '  ')]
+
+# Fixture to create master and log files with a deterministic mix of transactions
+@pytest.fixture
+def bank_files(tmpdir):
+    rng = random.Random(42)
+    numbers = rng.sample(range(1, 200), 60)
+    accounts = [{
+        'account_number': str(number),
+        'name': f"Holder {number}",
+        'status': rng.choice('AAAD'),
+        'balance': round(rng.uniform(0, 500), 2) if number % 7 else 0.0,
+        'total_transactions': rng.randrange(100),
+        'plan': rng.choice(('NP', 'SP'))
+    } for number in numbers]
+
+    old_master = tmpdir.join("old_master.txt")
+    FileIO.write_new_master_accounts(accounts, old_master)
+
+    log = tmpdir.join("log.txt")
+    with open(log, 'w') as file:
+        # Malformed line is skipped by every mode
+        file.write("04 Bad Line\n")
+        for _ in range(800):
+            code, misc = rng.choice(CODES)
+            number = rng.choice(numbers) if rng.random() < 0.8 else rng.randrange(1, 250)
+            amount = round(rng.uniform(0, 300), 2)
+            file.write(f"{code:02d} {'Holder ' + str(number):<20} {number:05d} {amount:08.2f} {misc}\n")
+
+    return tmpdir, old_master, log
+
+# Fixture to create a small master file and a log with one error of each kind
+@pytest.fixture
+def error_files(tmpdir):
+    old_master = tmpdir.join("old_master.txt")
+    old_master.write("00001 John Doe             A 00010.00 0001 NP\n"
+                     "00004 Jimmy Doe            D 00052.03 5513 SP\n")
+    log = tmpdir.join("log.txt")
+    log.write("04 Bad Line\n"
+              "04 John Doe             00001 00005.00   \n"
+              "04 John Doe             00001 00005.00   \n"
+              "01 John Doe             00001 00100.00   \n"
+              "04 Jimmy Doe            00004 00001.00   \n"
+              "01 Nobody               00009 00001.00   \n"
+              "00 John Doe             00000 00000.00   \n")
+    return tmpdir, old_master, log
+
+# Fixture committing the error files, optionally over a process pool
+@pytest.fixture
+def commit(error_files):
+    tmpdir, old_master, log = error_files
+    def run(processes=None):
+        BackEndSystem.commit_transactions(old_master, tmpdir.join("master.txt"), log, tmpdir.join("current.txt"),
+                                          processes)
+    return run
@@ -0,0 +1,75 @@
+import pickle
+import pytest
+from Account import Account
+from FileIO import FileIO
+
+# Template account for future tests
+@pytest.fixture
+def account():
+    return Account('1', 'John Doe', 'A', 100.00, 1, 'NP')
+
+
+
+class TestAccount:
+    """
+    Handles all tests related to Account
+    """
+
+    def test_item_access(self, account):
+        """
+        Fields are read and written like account dict keys
+        """
+        account['balance'] -= 10.00
+        account['status'] = 'D'
+
+        assert account['balance'] == 90.00
+        assert account.status == 'D'
+
+    def test_equals_dict(self, account):
+        """
+        Accounts compare equal to account dicts with the same fields
+        """
+        assert account == account.to_dict()
+        assert account != dict(account.to_dict(), plan='SP')
+
+    def test_pickle(self, account):
+        """
+        Accounts survive pickling for process pools and spilled runs
+        """
+        assert pickle.loads(pickle.dumps(account)) == account
+
+    def test_no_extra_fields(self, account):
+        """
+        Slots reject fields outside the account record
+        """
+        with pytest.raises(AttributeError):
+            account['nickname'] = 'Johnny'
+
+    def test_written_by_fileio(self, account, tmpdir):
+        """
+        Writers format Account records like account dicts
+        """
+        path = tmpdir.join("master.txt")
+        FileIO.write_new_master_accounts([account], path)
+
+        assert path.read() == "00001 John Doe             A 00100.00 0001 NP\n"
+        assert FileIO.read_old_bank_accounts(path) == [account]
+
+    def test_changed_fields_drop_record(self, tmpdir):
+        """
+        Assigning a field, by key or attribute, drops the master record so writers format it again
+        """
+        path = tmpdir.join("master.txt")
+        FileIO.write_new_master_accounts([Account(str(number), 'John Doe', 'A', 100.00, 1, 'NP')
+                                          for number in (1, 2, 3)], path)
+        accounts = FileIO.read_old_bank_accounts(path)
+        accounts[0]['balance'] = 1.00
+        accounts[0]['status'] = 'D'
+        accounts[1].plan = 'SP'
+        accounts[2].offset = 0
+        FileIO.write_new_master_accounts(accounts, path)
+
+        assert [account.source is None for account in accounts] == [True, True, False]
+        assert path.read().splitlines() == ["00001 John Doe             D 00001.00 0001 NP",
+                                            "00002 John Doe             A 00100.00 0001 SP",
+                                            "00003 John Doe             A 00100.00 0001 NP"]
@@ -0,0 +1,182 @@
+import pytest
+from AccountStore import AccountStore
+from Toolbox import Toolbox
+from TransactionHandler import TransactionHandler
+
+# Template accounts and transactions for future tests
+@pytest.fixture
+def accounts():
+    return [
+        {'account_number': '1', 'name': 'John Doe', 'status': 'A', 'balance': 100.00, 'total_transactions': 1, 'plan': 'NP'},
+        {'account_number': '2', 'name': 'Jane Doe', 'status': 'A', 'balance': 0.00, 'total_transactions': 0, 'plan': 'SP'},
+    ]
+
+@pytest.fixture
+def transaction():
+    return {
+        'transaction_code': 5,
+        'name': 'Jim Doe',
+        'account_number': '3',
+        'amount': 10.00,
+        'misc': 'NP'
+    }
+
+
+
+class TestAccountStore:
+    """
+    Handles all tests related to AccountStore
+    """
+
+    def test_lookup(self, accounts):
+        """
+        Accounts are found by account number
+        """
+        store = AccountStore(accounts)
+
+        assert store.get('2') is accounts[1]
+        assert store.get('3') is None
+        assert len(store) == 2
+
+    def test_search_account_uses_index(self, accounts, transaction):
+        """
+        Toolbox.search_account answers from the store index
+        """
+        store = AccountStore(accounts)
+        transaction['account_number'] = '1'
+
+        assert Toolbox.search_account(store, transaction) is accounts[0]
+
+    def test_duplicate_numbers(self, accounts):
+        """
+        Lookups return the first account with a number, like a list scan
+        """
+        duplicate = dict(accounts[0], name='Other Doe')
+        store = AccountStore(accounts + [duplicate])
+
+        assert store.get('1') is accounts[0]
+        store.remove(accounts[0])
+        assert store.get('1') is duplicate
+
+    def test_create_and_delete(self, accounts, transaction):
+        """
+        Handlers keep the index up to date when accounts are added and removed
+        """
+        store = AccountStore(accounts)
+
+        TransactionHandler.create(store, transaction)
+        assert store.get('3')['name'] == 'Jim Doe'
+
+        transaction['transaction_code'] = 6
+        transaction['account_number'] = '2'
+        TransactionHandler.delete(store, transaction)
+        assert store.get('2') is None
+        assert [acc['account_number'] for acc in store] == ['1', '3']
+
+    def test_delete_leaves_tombstone(self, accounts):
+        """
+        Deleted accounts are skipped until the store is compacted
+        """
+        store = AccountStore(accounts)
+        store.remove(accounts[0])
+
+        assert len(store) == 1
+        assert list(store) == [accounts[1]]
+        assert store.get('2') is accounts[1]
+
+        store.compact()
+        assert list(store) == [accounts[1]]
+        assert store.get('2') is accounts[1]
+
+    def test_removals_compact(self, accounts):
+        """
+        Removing most accounts compacts the store instead of keeping a tombstone per removal
+        """
+        store = AccountStore(dict(accounts[0], account_number=str(number)) for number in range(1, 101))
+        for number in range(1, 91):
+            store.remove(store.get(str(number)))
+
+        assert len(store) == 10
+        assert len(store._slots) < 20
+        assert [acc['account_number'] for acc in store.ordered()] == [str(number) for number in range(91, 101)]
+        assert store.get('95')['account_number'] == '95'
+
+    def test_create_after_delete(self, accounts, transaction):
+        """
+        Recreating a deleted account number appends a fresh account
+        """
+        store = AccountStore(accounts)
+        transaction['transaction_code'] = 6
+        transaction['account_number'] = '2'
+        TransactionHandler.delete(store, transaction)
+
+        transaction['transaction_code'] = 5
+        TransactionHandler.create(store, transaction)
+
+        assert [acc['name'] for acc in store] == ['John Doe', 'Jim Doe']
+        assert store.get('2')['name'] == 'Jim Doe'
+
+    def test_remove_missing(self, accounts):
+        """
+        Removing an account that is not stored raises like list.remove
+        """
+        store = AccountStore(accounts[:1])
+
+        with pytest.raises(ValueError):
+            store.remove(accounts[1])
+
+    def test_holders(self, accounts, transaction):
+        """
+        Holder name index follows creates and deletes once built
+        """
+        store = AccountStore(accounts)
+        assert store.holders('john  DOE') == ['1']
+        assert store.is_holder('2', 'Jane Doe') and not store.is_holder('2', 'John Doe')
+
+        TransactionHandler.create(store, dict(transaction, name='John Doe'))
+        transaction.update(transaction_code=6, account_number='2')
+        TransactionHandler.delete(store, transaction)
+
+        assert store.holders('John Doe') == ['1', '3']
+        assert store.holders('Jane Doe') == []
+
+        # Index is rebuilt after compacting
+        store.compact()
+        assert store.holders('John Doe') == ['1', '3']
+
+    def test_ordered(self, accounts, transaction):
+        """
+        Ordered index is numeric and follows creates and deletes once built
+        """
+        store = AccountStore([dict(accounts[0], account_number='10')] + accounts)
+        assert [acc['account_number'] for acc in store.ordered()] == ['1', '2', '10']
+
+        TransactionHandler.create(store, dict(transaction, account_number='9'))
+        store.append(dict(accounts[1]))
+        assert [acc['account_number'] for acc in store.ordered()] == ['1', '2', '2', '9', '10']
+
+        transaction.update(transaction_code=6, name='Jane Doe', account_number='2')
+        TransactionHandler.delete(store, transaction)
+        TransactionHandler.delete(store, transaction)
+        store.remove(store.get('10'))
+
+        assert [acc['account_number'] for acc in store.ordered()] == ['1', '9']
+
+    def test_range(self, accounts):
+        """
+        Range scans return accounts with account numbers in the inclusive range
+        """
+        store = AccountStore(dict(accounts[0], account_number=str(n)) for n in (30, 5, 12, 19, 20))
+
+        assert [acc['account_number'] for acc in store.range('10', '20')] == ['12', '19', '20']
+        assert store.range('21', '29') == []
+
+    def test_top_balances(self, accounts):
+        """
+        Top balances are highest first with ties in account number order
+        """
+        store = AccountStore(dict(accounts[0], account_number=str(n), balance=balance)
+                             for n, balance in ((3, 5.0), (1, 50.0), (2, 5.0), (4, 1.0)))
+
+        assert [acc['account_number'] for acc in store.top_balances(3)] == ['1', '2', '3']
+        assert len(store.top_balances(10)) == 4
@@ -0,0 +1,157 @@
+import asyncio
+from BackEndService import BackEndClient, BackEndService
+from BackEndSystem import BackEndSystem
+from FileIO import FileIO
+
+def service(tmpdir, old_master):
+    return BackEndService(old_master, tmpdir.join("journal.txt"), tmpdir.join("current.txt"),
+                          str(tmpdir.join("back_end.sock")), commit_interval=0.001, commit_size=64)
+
+async def submit(service, batches):
+    async def client(lines):
+        async with BackEndClient(service.socket_path) as connection:
+            return await connection.submit(lines)
+    return [await client(lines) for lines in batches]
+
+
+
+class TestBackEndService:
+    """
+    Handles all tests related to BackEndService and BackEndClient
+    """
+
+    def test_matches_batch_commit(self, bank_files, capsys):
+        """
+        Records sent over the socket give the journal, current accounts and errors of a batch commit
+        """
+        tmpdir, old_master, log = bank_files
+        lines = log.readlines()
+        BackEndSystem.commit_transactions(old_master, tmpdir.join("master.txt"), log, tmpdir.join("expected.txt"))
+        expected = capsys.readouterr().out.splitlines()
+
+        async def run():
+            back_end = service(tmpdir, old_master)
+            await back_end.start()
+            replies = await submit(back_end, [lines[:250], lines[250:]])
+            await back_end.stop()
+            return [reply for batch in replies for reply in batch]
+
+        replies = asyncio.run(run())
+
+        assert len(replies) == len(lines)
+        assert [reply for reply in replies if reply != "OK"] == expected
+        assert tmpdir.join("journal.txt").read() == log.read()
+        assert tmpdir.join("current.txt").read() == tmpdir.join("expected.txt").read()
+
+    def test_concurrent_clients(self, bank_files):
+        """
+        Each client receives one reply per record, in order, while batches are shared between clients
+        """
+        tmpdir, old_master, log = bank_files
+        lines = log.readlines()
+
+        async def run():
+            back_end = service(tmpdir, old_master)
+            await back_end.start()
+            async def client(lines):
+                async with BackEndClient(back_end.socket_path) as connection:
+                    return await connection.submit(lines)
+            replies = await asyncio.gather(*[client([line] * 50) for line in lines[:8]])
+            await back_end.stop()
+            return replies
+
+        replies = asyncio.run(run())
+
+        assert [len(batch) for batch in replies] == [50] * 8
+        assert all(reply == "OK" or reply.startswith("ERROR: ") for batch in replies for reply in batch)
+        assert sorted(tmpdir.join("journal.txt").read().splitlines(keepends=True)) == sorted(lines[:8] * 50)
+
+    def test_restart_replays_journal(self, bank_files, capsys):
+        """
+        A restarted service recovers account state from its journal
+        """
+        tmpdir, old_master, log = bank_files
+        lines = log.readlines()
+        BackEndSystem.commit_transactions(old_master, tmpdir.join("master.txt"), log, tmpdir.join("expected.txt"))
+        expected = capsys.readouterr().out.splitlines()
+
+        async def run(batch):
+            back_end = service(tmpdir, old_master)
+            await back_end.start()
+            replies = await submit(back_end, [batch])
+            await back_end.stop()
+            return replies[0]
+
+        replies = asyncio.run(run(lines[:300])) + asyncio.run(run(lines[300:]))
+
+        assert capsys.readouterr().out == ""
+        assert [reply for reply in replies if reply != "OK"] == expected
+        assert tmpdir.join("current.txt").read() == tmpdir.join("expected.txt").read()
+
+    def test_restart_after_torn_record(self, bank_files, capsys):
+        """
+        A record torn by a crash is dropped on restart instead of being joined to the next record
+        """
+        tmpdir, old_master, log = bank_files
+        lines = log.readlines()
+        BackEndSystem.commit_transactions(old_master, tmpdir.join("master.txt"), log, tmpdir.join("expected.txt"))
+
+        async def run(batch):
+            back_end = service(tmpdir, old_master)
+            await back_end.start()
+            await submit(back_end, [batch])
+            await back_end.stop()
+            return back_end.line_num
+
+        asyncio.run(run(lines[:300]))
+        tmpdir.join("journal.txt").write(lines[300][:20], mode='a')
+
+        assert asyncio.run(run(lines[300:])) == len(lines)
+        assert tmpdir.join("journal.txt").read() == log.read()
+        assert tmpdir.join("current.txt").read() == tmpdir.join("expected.txt").read()
+
+    def test_cancelled_quietly(self, bank_files, caplog):
+        """
+        Connections still open when the service is cancelled are closed without logging errors
+        """
+        tmpdir, old_master, log = bank_files
+
+        async def run():
+            back_end = service(tmpdir, old_master)
+            task = asyncio.create_task(back_end.serve_forever())
+            while back_end._server is None:
+                await asyncio.sleep(0.01)
+            async with BackEndClient(back_end.socket_path) as connection:
+                replies = await connection.submit(log.readlines()[1:3])
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+            return replies
+
+        assert len(asyncio.run(run())) == 2
+        assert not [record for record in caplog.records if record.levelname == "ERROR"]
+
+    def test_accounts_written_after_commit(self, bank_files):
+        """
+        The current accounts file never shows records the journal does not hold yet
+        """
+        tmpdir, old_master, log = bank_files
+        account = next(acc for acc in FileIO.read_old_bank_accounts(old_master) if acc['status'] == 'A')
+        deposit = f"04 {account['name']:<20} {int(account['account_number']):05d} 00001.00   \n"
+
+        async def run():
+            back_end = BackEndService(old_master, tmpdir.join("journal.txt"), tmpdir.join("current.txt"),
+                                      str(tmpdir.join("back_end.sock")), commit_interval=5, commit_size=2,
+                                      accounts_interval=0.05)
+            await back_end.start()
+            for _ in range(3):
+                back_end._apply(deposit.encode('ascii'))
+            await asyncio.sleep(0.2)
+            journal, current = tmpdir.join("journal.txt").read(), tmpdir.join("current.txt").read()
+            await back_end.stop()
+            return journal, current
+
+        journal, current = asyncio.run(run())
+
+        assert journal == deposit * 3
+        account['balance'] += 3
+        assert FileIO.format_current_account(account) in current.splitlines(keepends=True)
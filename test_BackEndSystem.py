@@ -0,0 +1,377 @@
+import random
+import pytest
+from BackEndSystem import BackEndSystem
+from FileIO import FileIO
+from Journal import Journal
+
+def transaction_line(code, name, number, amount, misc):
+    return f"{code:02d} {name:<20} {number:05d} {amount:08.2f} {misc}\n"
+
+def read(path):
+    with open(path) as file:
+        return file.read()
+
+
+
+class TestCommitTransactionsStreaming:
+    """
+    Handles all tests related to BackEndSystem.commit_transactions_streaming()
+    """
+
+    @pytest.mark.parametrize("memory_budget", [7, 100000])
+    def test_matches_in_memory(self, bank_files, memory_budget):
+        """
+        Streaming output is byte-identical to the in-memory path, with and without spilled runs
+        """
+        tmpdir, old_master, log = bank_files
+        BackEndSystem.commit_transactions(old_master, tmpdir.join("master_a.txt"), log, tmpdir.join("current_a.txt"))
+        BackEndSystem.commit_transactions_streaming(old_master, tmpdir.join("master_b.txt"), log,
+                                                    tmpdir.join("current_b.txt"), memory_budget)
+
+        assert read(tmpdir.join("master_a.txt")) == read(tmpdir.join("master_b.txt"))
+        assert read(tmpdir.join("current_a.txt")) == read(tmpdir.join("current_b.txt"))
+
+    def test_unsorted_master(self, tmpdir):
+        """
+        An unsorted master file is rejected
+        """
+        old_master = tmpdir.join("old_master.txt")
+        old_master.write("00002 Jane Doe             A 01762.95 0002 SP\n"
+                         "00001 John Doe             A 02510.89 0001 NP\n")
+        log = tmpdir.join("log.txt")
+        log.write(transaction_line(4, "John Doe", 1, 10, '  '))
+
+        with pytest.raises(ValueError):
+            BackEndSystem.commit_transactions_streaming(old_master, tmpdir.join("master.txt"), log,
+                                                        tmpdir.join("current.txt"))
+
+
+
+class TestCommitTransactionsParallel:
+    """
+    Handles all tests related to BackEndSystem.commit_transactions() with a process pool
+    """
+
+    @pytest.mark.parametrize("processes", [1, 3])
+    def test_matches_sequential(self, bank_files, capsys, processes):
+        """
+        Sharded output and error order are identical to sequential application
+        """
+        tmpdir, old_master, log = bank_files
+        # Malformed lines among valid ones are reported in log order too
+        lines = read(log).splitlines(keepends=True)
+        log.write(''.join(lines[:400] + ["04 Bad Line\n"] + lines[400:700] + ["01 Short\n"] + lines[700:]))
+        BackEndSystem.commit_transactions(old_master, tmpdir.join("master_a.txt"), log, tmpdir.join("current_a.txt"))
+        sequential_errors = capsys.readouterr().out
+        BackEndSystem.commit_transactions(old_master, tmpdir.join("master_b.txt"), log, tmpdir.join("current_b.txt"),
+                                          processes=processes)
+
+        assert capsys.readouterr().out == sequential_errors
+        assert read(tmpdir.join("master_a.txt")) == read(tmpdir.join("master_b.txt"))
+        assert read(tmpdir.join("current_a.txt")) == read(tmpdir.join("current_b.txt"))
+
+
+
+class TestCommitTransactionsCents:
+    """
+    Handles all tests related to BackEndSystem.commit_transactions() with integer cents
+    """
+
+    def test_matches_float_engine(self, bank_files, capsys):
+        """
+        Cents engine produces the same files and errors when floats do not drift
+        """
+        tmpdir, old_master, log = bank_files
+        BackEndSystem.commit_transactions(old_master, tmpdir.join("master_a.txt"), log, tmpdir.join("current_a.txt"))
+        float_errors = capsys.readouterr().out
+        BackEndSystem.commit_transactions(old_master, tmpdir.join("master_b.txt"), log, tmpdir.join("current_b.txt"),
+                                          cents=True)
+
+        assert capsys.readouterr().out == float_errors
+        assert read(tmpdir.join("master_a.txt")) == read(tmpdir.join("master_b.txt"))
+        assert read(tmpdir.join("current_a.txt")) == read(tmpdir.join("current_b.txt"))
+
+    def test_streaming(self, bank_files):
+        """
+        Cents engine streams to the same files as it writes in memory
+        """
+        tmpdir, old_master, log = bank_files
+        BackEndSystem.commit_transactions(old_master, tmpdir.join("master_a.txt"), log, tmpdir.join("current_a.txt"),
+                                          cents=True)
+        BackEndSystem.commit_transactions_streaming(old_master, tmpdir.join("master_b.txt"), log,
+                                                    tmpdir.join("current_b.txt"), 50, cents=True)
+
+        assert read(tmpdir.join("master_a.txt")) == read(tmpdir.join("master_b.txt"))
+        assert read(tmpdir.join("current_a.txt")) == read(tmpdir.join("current_b.txt"))
+
+
+
+class TestCommitTransactionsIncremental:
+    """
+    Handles all tests related to BackEndSystem.commit_transactions_incremental()
+    """
+
+    def test_matches_full_rewrite(self, bank_files):
+        """
+        The updated master holds the same accounts as a full rewrite and the current file is identical
+        """
+        tmpdir, old_master, log = bank_files
+        BackEndSystem.commit_transactions(old_master, tmpdir.join("master_a.txt"), log, tmpdir.join("current_a.txt"))
+        old_master.copy(tmpdir.join("master_b.txt"))
+        BackEndSystem.commit_transactions_incremental(tmpdir.join("master_b.txt"), log, tmpdir.join("current_b.txt"),
+                                                      compact_ratio=1)
+
+        expected = FileIO.read_old_bank_accounts(tmpdir.join("master_a.txt"))
+        accounts = FileIO.read_old_bank_accounts(tmpdir.join("master_b.txt"))
+        key = (lambda x: int(x['account_number']))
+        assert sorted(accounts, key=key) == sorted(expected, key=key)
+        assert read(tmpdir.join("current_a.txt")) == read(tmpdir.join("current_b.txt"))
+        assert FileIO.MASTER_TOMBSTONE in read(tmpdir.join("master_b.txt"))
+
+    def test_only_changed_records_rewritten(self, tmpdir):
+        """
+        Untouched records keep their bytes, deletes leave tombstones and creates are appended
+        """
+        old_master = ("00001 John Doe             A 02510.89 0001 NP\n"
+                      "00002 Jane Doe             A 01762.95 0002 SP\n"
+                      "00003 Jenny Doe            A 00012.03 0021 SP\n"
+                      "00004 Jimmy Doe            D 00052.03 5513 SP\n"
+                      "00005 John Doe             A 00000.00 0001 NP\n")
+        master = tmpdir.join("master.txt")
+        master.write(old_master)
+        log = tmpdir.join("log.txt")
+        log.write(transaction_line(4, "Jane Doe", 2, 10, '  ') +
+                  transaction_line(6, "John Doe", 5, 0, '  ') +
+                  transaction_line(5, "Jim Doe", 7, 5, 'SP'))
+
+        BackEndSystem.commit_transactions_incremental(master, log, tmpdir.join("current.txt"), compact_ratio=1)
+
+        lines = read(master).splitlines()
+        assert lines[0] == old_master.splitlines()[0]
+        assert lines[1] == "00002 Jane Doe             A 01772.95 0003 SP"
+        assert lines[4] == FileIO.MASTER_TOMBSTONE
+        assert lines[5] == "00007 Jim Doe              A 00005.00 0000 SP"
+        assert [acc['account_number'] for acc in FileIO.read_old_bank_accounts(master)] == ['1', '2', '3', '4', '7']
+        assert FileIO.read_old_bank_accounts_mapped(master) == FileIO.read_old_bank_accounts(master)
+
+    def test_compaction(self, bank_files):
+        """
+        Passing the tombstone ratio rewrites the master sorted and without tombstones
+        """
+        tmpdir, old_master, log = bank_files
+        BackEndSystem.commit_transactions(old_master, tmpdir.join("master_a.txt"), log, tmpdir.join("current_a.txt"))
+        old_master.copy(tmpdir.join("master_b.txt"))
+        BackEndSystem.commit_transactions_incremental(tmpdir.join("master_b.txt"), log, tmpdir.join("current_b.txt"),
+                                                      compact_ratio=0)
+
+        assert read(tmpdir.join("master_a.txt")) == read(tmpdir.join("master_b.txt"))
+
+
+
+class TestCommitTransactionsResumable:
+    """
+    Handles all tests related to BackEndSystem.commit_transactions_resumable()
+    """
+
+    def test_matches_in_memory(self, bank_files, capsys):
+        """
+        An uninterrupted run produces the same files and errors and leaves no journal behind
+        """
+        tmpdir, old_master, log = bank_files
+        BackEndSystem.commit_transactions(old_master, tmpdir.join("master_a.txt"), log, tmpdir.join("current_a.txt"))
+        expected = capsys.readouterr().out
+        BackEndSystem.commit_transactions_resumable(old_master, tmpdir.join("master_b.txt"), log,
+                                                    tmpdir.join("current_b.txt"), tmpdir.join("journal"), 100, 30)
+
+        assert capsys.readouterr().out == expected
+        assert read(tmpdir.join("master_a.txt")) == read(tmpdir.join("master_b.txt"))
+        assert read(tmpdir.join("current_a.txt")) == read(tmpdir.join("current_b.txt"))
+        assert not tmpdir.join("journal").exists() and not tmpdir.join("journal.checkpoint").exists()
+
+    @pytest.mark.parametrize("crash_after", [1, 4, 7])
+    def test_resume_after_crash(self, bank_files, capsys, monkeypatch, crash_after):
+        """
+        A rerun after an interruption resumes from the checkpoint, reporting each error exactly once
+        """
+        tmpdir, old_master, log = bank_files
+        BackEndSystem.commit_transactions(old_master, tmpdir.join("master_a.txt"), log, tmpdir.join("current_a.txt"))
+        expected = capsys.readouterr().out
+
+        record = Journal.record
+        calls = []
+        def crashing_record(journal, line_num):
+            record(journal, line_num)
+            calls.append(line_num)
+            if len(calls) == crash_after:
+                raise RuntimeError("Interrupted")
+
+        monkeypatch.setattr(Journal, 'record', crashing_record)
+        with pytest.raises(RuntimeError):
+            BackEndSystem.commit_transactions_resumable(old_master, tmpdir.join("master_b.txt"), log,
+                                                        tmpdir.join("current_b.txt"), tmpdir.join("journal"), 100, 30)
+        assert not tmpdir.join("master_b.txt").exists()
+        monkeypatch.setattr(Journal, 'record', record)
+
+        BackEndSystem.commit_transactions_resumable(old_master, tmpdir.join("master_b.txt"), log,
+                                                    tmpdir.join("current_b.txt"), tmpdir.join("journal"), 100, 30)
+
+        assert capsys.readouterr().out == expected
+        assert read(tmpdir.join("master_a.txt")) == read(tmpdir.join("master_b.txt"))
+        assert read(tmpdir.join("current_a.txt")) == read(tmpdir.join("current_b.txt"))
+
+    def test_torn_record_dropped(self, bank_files):
+        """
+        A journal line torn by a crash is dropped before the resumed run appends to the journal
+        """
+        tmpdir, old_master, log = bank_files
+        journal = Journal(tmpdir.join("journal"), (old_master, log))
+        journal.begin()
+        journal.record(10)
+        with open(tmpdir.join("journal"), 'a') as file:
+            file.write("20")
+
+        journal = Journal(tmpdir.join("journal"), (old_master, log))
+        assert journal.recover() == (None, 0, 10)
+        journal.begin()
+        journal.record(300)
+
+        assert Journal(tmpdir.join("journal"), (old_master, log)).recover() == (None, 0, 300)
+        assert read(tmpdir.join("journal")).splitlines()[1:] == ["10", "300"]
+
+    def test_changed_inputs_restart(self, bank_files, capsys):
+        """
+        A journal left over from different inputs is discarded
+        """
+        tmpdir, old_master, log = bank_files
+        journal = Journal(tmpdir.join("journal"), (old_master, log))
+        journal.begin()
+        journal.checkpoint([], 500)
+        journal.record(500)
+        with open(log, 'a') as file:
+            file.write(transaction_line(4, "Nobody", 250, 1, '  '))
+
+        BackEndSystem.commit_transactions(old_master, tmpdir.join("master_a.txt"), log, tmpdir.join("current_a.txt"))
+        expected = capsys.readouterr().out
+        BackEndSystem.commit_transactions_resumable(old_master, tmpdir.join("master_b.txt"), log,
+                                                    tmpdir.join("current_b.txt"), tmpdir.join("journal"))
+
+        assert capsys.readouterr().out == expected
+        assert read(tmpdir.join("master_a.txt")) == read(tmpdir.join("master_b.txt"))
+
+
+
+class TestCommitTransactionsCatchup:
+    """
+    Handles all tests related to BackEndSystem.commit_transactions_catchup()
+    """
+
+    @pytest.fixture
+    def daily_logs(self, bank_files):
+        tmpdir, old_master, log = bank_files
+        rng = random.Random(7)
+        lines = read(log).splitlines(keepends=True)
+        logs = [log]
+        for day in range(2):
+            path = tmpdir.join(f"log_{day}.txt")
+            # Later days revisit the same accounts in a different order
+            path.write(''.join(rng.sample(lines, len(lines))))
+            logs.append(path)
+
+        # 0.30 - 0.10 leaves a float just under 0.20 unless balances are normalised between days
+        with open(logs[1], 'a') as file:
+            file.write(transaction_line(5, "New", 245, 0.3, 'SP') + transaction_line(1, "New", 245, 0.1, '  '))
+        with open(logs[2], 'a') as file:
+            file.write(transaction_line(1, "New", 245, 0.2, '  '))
+        return tmpdir, old_master, logs
+
+    @pytest.mark.parametrize("cents", [False, True])
+    def test_matches_day_by_day(self, daily_logs, capsys, cents):
+        """
+        Final files and errors equal those of committing each day in turn
+        """
+        tmpdir, old_master, logs = daily_logs
+        master = old_master
+        for day, log in enumerate(logs):
+            BackEndSystem.commit_transactions(master, tmpdir.join(f"master_{day}.txt"), log,
+                                              tmpdir.join(f"current_{day}.txt"), cents=cents)
+            master = tmpdir.join(f"master_{day}.txt")
+        expected = capsys.readouterr().out
+
+        BackEndSystem.commit_transactions_catchup(old_master, tmpdir.join("master.txt"), logs,
+                                                  tmpdir.join("current.txt"), cents=cents)
+
+        assert capsys.readouterr().out == expected
+        assert read(tmpdir.join("master.txt")) == read(master)
+        assert read(tmpdir.join("current.txt")) == read(tmpdir.join(f"current_{len(logs) - 1}.txt"))
+
+    def test_daily_paths(self, daily_logs):
+        """
+        Intermediate files are written only for the days asked for
+        """
+        tmpdir, old_master, logs = daily_logs
+        BackEndSystem.commit_transactions(old_master, tmpdir.join("master_a.txt"), logs[0],
+                                          tmpdir.join("current_a.txt"))
+
+        BackEndSystem.commit_transactions_catchup(old_master, tmpdir.join("master.txt"), logs,
+                                                  tmpdir.join("current.txt"),
+                                                  [(tmpdir.join("master_b.txt"), tmpdir.join("current_b.txt")),
+                                                   None, None])
+
+        assert read(tmpdir.join("master_a.txt")) == read(tmpdir.join("master_b.txt"))
+        assert read(tmpdir.join("current_a.txt")) == read(tmpdir.join("current_b.txt"))
+        assert sorted(path.basename for path in tmpdir.listdir() if path.basename.startswith("master")) == \
+               ["master.txt", "master_a.txt", "master_b.txt"]
+
+
+
+class TestCommitSessions:
+    """
+    Handles all tests related to BackEndSystem.commit_sessions()
+    """
+
+    def test_matches_merged_log(self, bank_files, capsys):
+        """
+        Merging session files on the fly matches committing their concatenation
+        """
+        tmpdir, old_master, log = bank_files
+        lines = read(log).splitlines(keepends=True)
+        sessions = []
+        for sequence, start in enumerate(range(0, len(lines), 37)):
+            path = tmpdir.join(f"session_{sequence}.txt")
+            path.write(''.join(lines[start:start + 37]))
+            sessions.append((sequence, path))
+        random.Random(3).shuffle(sessions)
+
+        BackEndSystem.commit_transactions(old_master, tmpdir.join("master_a.txt"), log, tmpdir.join("current_a.txt"))
+        expected = capsys.readouterr().out
+        BackEndSystem.commit_sessions(old_master, tmpdir.join("master_b.txt"), sessions, tmpdir.join("current_b.txt"))
+
+        assert capsys.readouterr().out == expected
+        assert read(tmpdir.join("master_a.txt")) == read(tmpdir.join("master_b.txt"))
+        assert read(tmpdir.join("current_a.txt")) == read(tmpdir.join("current_b.txt"))
+
+
+
+class TestCommitTransactionsSnapshot:
+    """
+    Handles all tests related to binary master snapshots in BackEndSystem.commit_transactions()
+    """
+
+    def test_next_day_from_snapshot(self, bank_files):
+        """
+        A day started from the snapshot of the previous master produces the same files
+        """
+        pytest.importorskip("numpy")
+        tmpdir, old_master, log = bank_files
+        BackEndSystem.commit_transactions(old_master, tmpdir.join("master_1.txt"), log, tmpdir.join("current_1.txt"),
+                                          snapshot=True)
+        assert tmpdir.join("master_1.txt.snap").exists()
+
+        BackEndSystem.commit_transactions(tmpdir.join("master_1.txt"), tmpdir.join("master_a.txt"), log,
+                                          tmpdir.join("current_a.txt"))
+        tmpdir.join("master_1.txt.snap").remove()
+        BackEndSystem.commit_transactions(tmpdir.join("master_1.txt"), tmpdir.join("master_b.txt"), log,
+                                          tmpdir.join("current_b.txt"))
+
+        assert read(tmpdir.join("master_a.txt")) == read(tmpdir.join("master_b.txt"))
+        assert read(tmpdir.join("current_a.txt")) == read(tmpdir.join("current_b.txt"))
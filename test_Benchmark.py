@@ -0,0 +1,64 @@
+import pytest
+from Benchmark import Benchmark
+from FileIO import FileIO
+
+# Fixture to generate a small master and log pair
+@pytest.fixture
+def generated(tmpdir):
+    master = tmpdir.join("master.txt")
+    log = tmpdir.join("log.txt")
+    numbers = Benchmark.generate_master(master, accounts=300, seed=1)
+    Benchmark.generate_log(log, numbers, transactions=2000, seed=1, error_rate=0.1)
+    return master, log, numbers
+
+
+
+class TestBenchmark:
+    """
+    Handles all tests related to Benchmark
+    """
+
+    def test_master_is_valid(self, generated, capsys):
+        """
+        Generated master files parse without errors and are sorted like written masters
+        """
+        master, _, numbers = generated
+        accounts = FileIO.read_old_bank_accounts(master)
+
+        assert capsys.readouterr().out == ""
+        assert [acc['account_number'] for acc in accounts] == [str(number) for number in numbers]
+
+    def test_log_is_deterministic(self, generated, tmpdir):
+        """
+        The same seed generates the same log, with malformed lines at roughly the error rate
+        """
+        _, log, numbers = generated
+        Benchmark.generate_log(tmpdir.join("again.txt"), numbers, transactions=2000, seed=1, error_rate=0.1)
+
+        assert log.read() == tmpdir.join("again.txt").read()
+        assert 2000 * 0.02 < 2000 - len(FileIO.read_transactions(log)) < 2000 * 0.1
+
+    def test_log_too_long(self, tmpdir):
+        """
+        Logs needing more lines than the accounts can take under the line cap are refused
+        """
+        with pytest.raises(ValueError, match="^Cannot draw 30000 transactions from 3 accounts"):
+            Benchmark.generate_log(tmpdir.join("log.txt"), [1, 2, 3], transactions=30000)
+
+    def test_compare(self):
+        """
+        Cases slower than the tolerance allows are flagged as regressions
+        """
+        rows = Benchmark.compare({'apply': {'seconds': 1.5}, 'new_case': {'seconds': 1.0}},
+                                 {'apply': {'seconds': 1.0}}, tolerance=0.2)
+
+        assert rows == [('apply', 'seconds', 1.0, 1.5, 1.5, True)]
+
+    def test_run(self):
+        """
+        Every phase is timed on generated files
+        """
+        results = Benchmark.run(accounts=50, transactions=200, repeat=1, memory=False)
+
+        assert 'commit_transactions' in results
+        assert all(metrics['seconds'] > 0 for metrics in results.values())
@@ -0,0 +1,86 @@
+import random
+import pytest
+from unittest.mock import patch
+from Account import Account
+from AccountStore import AccountStore
+from CentsTransactionHandler import CentsTransactionHandler
+from TransactionHandler import TransactionHandler
+
+# Template account and transactions for future tests
+@pytest.fixture
+def account_template():
+    return Account('1', 'John Doe', 'A', 9999899, 1, 'NP')
+
+@pytest.fixture
+def deposits():
+    return [{
+        'transaction_code': 4,
+        'name': 'John Doe',
+        'account_number': '1',
+        'amount': 10,
+        'misc': '  '
+    } for _ in range(10)]
+
+
+
+class TestCentsTransactionHandler:
+    """
+    Handles all tests related to CentsTransactionHandler
+    """
+
+    def test_deposits_reach_limit_exactly(self, account_template, deposits):
+        """
+        Ten deposits of 0.10 onto 99998.99 land exactly on the balance limit
+        """
+        accounts = AccountStore([account_template])
+        CentsTransactionHandler.apply(accounts, deposits)
+
+        assert account_template['balance'] == 9999999
+        assert account_template['total_transactions'] == 11
+
+    def test_float_engine_drifts(self, account_template, deposits):
+        """
+        The float engine rejects the last deposit through accumulated rounding error
+        """
+        account_template['balance'] = 99998.99
+        for transaction in deposits:
+            transaction['amount'] = 0.10
+
+        with patch('TransactionHandler.Toolbox.log_constraint_error') as mock_error:
+            TransactionHandler.apply(AccountStore([account_template]), deposits)
+
+        mock_error.assert_called_once_with("Balance Limit Exceeded", "Cannot deposit 0.10 into account 1")
+
+    def test_messages_formatted_from_cents(self, account_template, deposits):
+        """
+        Constraint errors format cent amounts like the float engine formats dollars
+        """
+        deposits[0]['transaction_code'] = 1
+        deposits[0]['amount'] = 10000005
+        with patch('TransactionHandler.Toolbox.log_constraint_error') as mock_error:
+            CentsTransactionHandler.apply(AccountStore([account_template]), deposits[:1])
+
+        mock_error.assert_called_once_with("Insufficient Funds", "Cannot withdraw 100000.05 from account 1")
+
+    def test_coalesced_runs_match_sequential(self, account_template, capsys):
+        """
+        Long monetary runs on one account crossing both balance limits match applying transactions one by one
+        """
+        rng = random.Random(11)
+        transactions = [{'transaction_code': code, 'name': 'John Doe', 'account_number': '1',
+                         'amount': rng.randrange(40000), 'misc': rng.choice(['SD', 'RV'])}
+                        for codes in ([1, 2, 3, 4, 4, 4], [1, 1, 2, 3, 4]) for code in rng.choices(codes, k=1500)]
+        handlers = {1: CentsTransactionHandler.withdraw, 2: CentsTransactionHandler.transfer,
+                    3: CentsTransactionHandler.paybill, 4: CentsTransactionHandler.deposit}
+
+        expected = [Account('1', 'John Doe', 'A', 9999899, 1, 'NP')]
+        for transaction in transactions:
+            handlers[transaction['transaction_code']](expected, transaction)
+        expected_errors = capsys.readouterr().out
+
+        accounts = AccountStore([account_template])
+        CentsTransactionHandler.apply(accounts, transactions)
+
+        assert "Balance Limit Exceeded" in expected_errors and "Insufficient Funds" in expected_errors
+        assert list(accounts) == expected
+        assert capsys.readouterr().out == expected_errors
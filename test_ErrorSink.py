@@ -0,0 +1,99 @@
+import io
+import json
+import pytest
+import threading
+import time
+from ErrorSink import CollectingSink, ErrorSink, JsonLinesSink, PrintSink
+from Toolbox import Toolbox
+
+
+class TestErrorSink:
+    """
+    Handles all tests related to ErrorSink and its subclasses
+    """
+
+    @pytest.mark.parametrize("background", [False, True])
+    def test_print_sink_matches_print(self, commit, capsys, background):
+        """
+        PrintSink emits exactly the lines printed without a sink
+        """
+        commit()
+        expected = capsys.readouterr().out
+
+        stream = io.StringIO()
+        with PrintSink(stream, buffer_size=2, background=background):
+            commit()
+
+        assert stream.getvalue() == expected
+        assert capsys.readouterr().out == ""
+        assert expected.count("ERROR:") == 4
+
+    def test_flush_wait(self):
+        """
+        Flushing with wait returns only once the background writer has written every record
+        """
+        written = []
+        started = threading.Event()
+
+        class SlowSink(ErrorSink):
+            def write(self, records):
+                started.set()
+                time.sleep(0.1)
+                written.extend(records)
+
+        with SlowSink(buffer_size=1, background=True) as sink:
+            sink.record("Insufficient Funds", "first")
+            started.wait()
+            sink.record("Insufficient Funds", "second")
+            sink.flush(wait=True)
+            assert [record.description for record in written] == ["first", "second"]
+
+    def test_failed_background_write(self):
+        """
+        A failed background write is raised from flush and close instead of leaving them waiting
+        """
+        class FailingSink(ErrorSink):
+            def write(self, records):
+                raise OSError("disk full")
+
+        raised = []
+        def run():
+            sink = FailingSink(buffer_size=1, background=True)
+            sink.record("Insufficient Funds", "first")
+            sink.record("Insufficient Funds", "second")
+            for finish in (lambda: sink.flush(wait=True), sink.close):
+                with pytest.raises(OSError, match="disk full"):
+                    finish()
+                raised.append(finish)
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        thread.join(5)
+        assert not thread.is_alive()
+        assert len(raised) == 2
+
+    def test_structured_records(self, commit):
+        """
+        Records carry constraint type, account, line number and transaction code, with per-type counts
+        """
+        with CollectingSink() as sink:
+            commit()
+
+        records = {record.line_number: record for record in sink.records}
+        assert records[4] == ("Insufficient Funds", "Cannot withdraw 100.00 from account 1", '1', 4, 1)
+        assert records[1] == (ErrorSink.FATAL, "Invalid length (11 chars)", None, 1, None)
+        assert sink.counts == {"Insufficient Funds": 1, ErrorSink.FATAL: 1, "Account Disabled": 1,
+                               "Account Not Found": 1}
+        assert Toolbox.error_sink is None
+
+    def test_json_lines(self, commit):
+        """
+        JsonLinesSink writes one JSON object per record
+        """
+        stream = io.StringIO()
+        with JsonLinesSink(stream):
+            commit()
+
+        records = [json.loads(line) for line in stream.getvalue().splitlines()]
+        assert sorted(record['line_number'] for record in records) == [1, 4, 5, 6]
+        assert records[2]['account_number'] == '4'
@@ -156,4 +156,291 @@ def test_invalid_amount_format(create_temp_file):
     transactions = FileIO.read_transactions(create_temp_file)
 
     # Assert that no transactions are read due to invalid amount format
-    assert len(transactions) == 0  # No valid transactions should be read
\ No newline at end of file
+    assert len(transactions) == 0  # No valid transactions should be read
+
+# Master file lines covering each fatal error the master reader reports
+MASTER_LINES = [
+    "00001 John Doe             A 02510.89 0001 NP",
+    "0000A Bad Number           A 02510.89 0001 NP",
+    "00003 Bad Status           X 00012.03 0021 SP",
+    "00004 Bad Balance          D 0005203. 5513 SP",
+    "00005 Bad Count            A 00114.50 00x1 NP",
+    "00006 Bad Plan             A 00114.50 0001 XP",
+    "00010 Jimmy Doe            D 00052.03 5513 SP",
+]
+
+
+# Test case: memory-mapped master reader matches the line by line reader
+def test_mapped_master_matches_reader(create_temp_file, capsys):
+    pytest.importorskip("numpy")
+    # Last line has no trailing newline
+    create_temp_file.write("\n".join(MASTER_LINES))
+
+    expected = FileIO.read_old_bank_accounts(create_temp_file)
+    expected_errors = capsys.readouterr().out
+    accounts = FileIO.read_old_bank_accounts_mapped(create_temp_file)
+
+    # Assert that accounts and fatal errors are identical
+    assert accounts == expected
+    assert capsys.readouterr().out == expected_errors
+    assert len(accounts) == 2
+
+
+# Test case: memory-mapped master reader falls back for lines of the wrong length
+def test_mapped_master_invalid_length(create_temp_file, capsys):
+    create_temp_file.write("\n".join(MASTER_LINES + ["00011 Short"]) + "\n")
+
+    accounts = FileIO.read_old_bank_accounts_mapped(create_temp_file)
+
+    # Assert that the short line is reported with its line number
+    assert len(accounts) == 2
+    assert "ERROR: Fatal error - Line 8: Invalid length (11 chars)" in capsys.readouterr().out
+
+
+# Test case: chunked transaction reader splits lines like text mode at any chunk size
+@pytest.mark.parametrize("chunk_size", [1, 7, 41, 42, 1 << 20])
+def test_chunked_transactions(create_temp_file, capsys, chunk_size):
+    lines = [
+        "04 John Doe             00001 00100.00   \n",
+        "01 Jane Doe             00002 00010.00   \r\n",
+        "04 Bad Line\r",
+        "03 Jenny Doe            00003 00001.50 EC\r",
+        "08 Jimmy Doe            00004 00000.00 SP",
+    ]
+    with open(create_temp_file, 'wb') as file:
+        file.write("".join(lines).encode())
+
+    # Reference parse of each line read in text mode
+    with open(create_temp_file, 'r') as file:
+        expected = [FileIO.parse_transaction(n, line.rstrip('\n')) for n, line in enumerate(file, 1)]
+    expected = [transaction for transaction in expected if transaction is not None]
+    expected_errors = capsys.readouterr().out
+    transactions = list(FileIO.iter_transactions(create_temp_file, chunk_size))
+
+    # Assert that transactions and fatal errors match text mode
+    assert transactions == expected
+    assert capsys.readouterr().out == expected_errors == "ERROR: Fatal error - Line 3: Invalid length (11 chars)\n"
+    assert [t['account_number'] for t in transactions] == ['1', '2', '3', '4']
+
+
+# Test case: combined writer produces the same files as both writers
+def test_combined_writer(tmpdir):
+    accounts = FileIO.read_old_bank_accounts("test_files/old_master.txt")[::-1]
+    FileIO.write_new_master_accounts(list(accounts), tmpdir.join("master_a.txt"))
+    FileIO.write_new_current_accounts(sorted(accounts, key=lambda x: int(x['account_number'])), tmpdir.join("current_a.txt"))
+
+    FileIO.write_new_accounts(accounts, tmpdir.join("master_b.txt"), tmpdir.join("current_b.txt"))
+
+    # Assert that both files are identical
+    assert tmpdir.join("master_a.txt").read() == tmpdir.join("master_b.txt").read()
+    assert tmpdir.join("current_a.txt").read() == tmpdir.join("current_b.txt").read()
+    assert tmpdir.join("current_b.txt").read().endswith(FileIO.CURRENT_ACCOUNTS_END)
+
+
+# Test case: master file is written in numeric account number order, streamed from a store
+def test_master_numeric_order(tmpdir):
+    from AccountStore import AccountStore
+    accounts = FileIO.read_old_bank_accounts("test_files/old_master.txt")
+    for number, acc in zip(('10', '9', '100', '1', '20'), accounts):
+        acc['account_number'] = number
+    FileIO.write_new_master_accounts(AccountStore(accounts), tmpdir.join("master.txt"))
+
+    # Assert that records are in numeric rather than string order
+    assert [line[:5] for line in tmpdir.join("master.txt").readlines()] == \
+           ['00001', '00009', '00010', '00020', '00100']
+
+
+# Test case: unchanged master records are copied and changed ones formatted again
+@pytest.mark.parametrize("mapped", [False, True])
+def test_master_passthrough(tmpdir, mapped):
+    from AccountStore import AccountStore
+    from TransactionHandler import TransactionHandler
+    master = tmpdir.join("master.txt")
+    master.write("00001 John Doe             A 00010.00 0001 NP\n"
+                 "00002  Jane Doe            A 00020.00 0002 SP\n"
+                 "00003 Jim Doe              A 00030.00 0003 NP\n"
+                 "00004_Jo Doe               A 00040.00 0004 NP")
+    reader = FileIO.read_old_bank_accounts_mapped if mapped else FileIO.read_old_bank_accounts
+    accounts = AccountStore(reader(master))
+    TransactionHandler.apply(accounts, [{'transaction_code': 4, 'name': 'Jim Doe', 'account_number': '3',
+                                         'amount': 5.00, 'misc': '  '}])
+    FileIO.write_new_master_accounts(accounts, tmpdir.join("new_master.txt"))
+
+    # Assert that only the untouched record with plain spacing is kept, and output matches formatting
+    assert [acc.source is not None for acc in accounts] == [True, False, False, False]
+    assert tmpdir.join("new_master.txt").read() == "00001 John Doe             A 00010.00 0001 NP\n" \
+                                                   "00002 Jane Doe             A 00020.00 0002 SP\n" \
+                                                   "00003 Jim Doe              A 00035.00 0004 NP\n" \
+                                                   "00004 Jo Doe               A 00040.00 0004 NP\n"
+
+
+# Test case: in place updates only write rows of changed, deleted and created accounts read by the mapped reader
+@pytest.mark.parametrize("mapped", [False, True])
+def test_update_master_in_place(tmpdir, capsys, mapped):
+    pytest.importorskip("numpy")
+    from AccountStore import AccountStore
+    from TransactionHandler import TransactionHandler
+    master = tmpdir.join("master.txt")
+    master.write("00003 Jim Doe              A 00030.00 0003 NP\n"
+                 "00001_John Doe             A 00010.00 0001 NP\n"
+                 "0000x Broken               A 00010.00 0001 NP\n"
+                 "00002 Jane Doe             A 00000.00 0002 SP\n"
+                 "00004 Jo Doe               A 00040.00 0004 NP")
+    reader = FileIO.read_old_bank_accounts_mapped if mapped else FileIO.read_old_bank_accounts
+    accounts = AccountStore(reader(master))
+    TransactionHandler.apply(accounts, [
+        {'transaction_code': code, 'name': name, 'account_number': number, 'amount': amount, 'misc': misc}
+        for code, name, number, amount, misc in [(4, 'Jim Doe', '3', 5.00, '  '), (6, 'Jane Doe', '2', 0.00, '  '),
+                                                 (5, 'Jim Doe', '7', 5.00, 'SP')]])
+    FileIO.update_master_accounts(accounts, master, compact_ratio=1)
+
+    # Assert that rows keep their place when read by the mapped reader, which keeps record offsets
+    if mapped:
+        assert master.read().splitlines() == ["00003 Jim Doe              A 00035.00 0004 NP",
+                                              "00001 John Doe             A 00010.00 0001 NP",
+                                              FileIO.MASTER_TOMBSTONE,
+                                              FileIO.MASTER_TOMBSTONE,
+                                              "00004 Jo Doe               A 00040.00 0004 NP",
+                                              "00007 Jim Doe              A 00005.00 0000 SP"]
+    else:
+        assert [line[:5] for line in master.read().splitlines()] == ['00001', '00003', '00004', '00007']
+
+
+# Test case: a writer failing on invalid data leaves the existing file untouched
+def test_atomic_write(tmpdir):
+    path = tmpdir.join("master.txt")
+    path.write("previous contents\n")
+    accounts = [{'account_number': '1', 'name': 'John Doe', 'status': 'A', 'balance': 1.0,
+                 'total_transactions': 1, 'plan': 'NP'},
+                {'account_number': '2', 'name': 'Jane Doe', 'status': 'A', 'balance': -1.0,
+                 'total_transactions': 1, 'plan': 'NP'}]
+
+    with pytest.raises(ValueError):
+        FileIO.write_new_master_accounts(accounts, path)
+
+    # Assert that neither a partial file nor the temporary file remain
+    assert path.read() == "previous contents\n"
+    assert tmpdir.listdir() == [path]
+
+
+# Test case: failing to open the temporary file raises that error alone and syncs nothing
+def test_atomic_open_missing_directory(tmpdir):
+    path = tmpdir.join("missing", "master.txt")
+
+    with pytest.raises(FileNotFoundError) as error:
+        with FileIO.atomic_open(path):
+            pass
+
+    # Assert that no second error from removing the temporary file masks the first
+    assert error.value.filename == f"{path}.tmp"
+    assert error.value.__context__ is None
+
+
+# Test case: transactions are read from a range of lines, keeping their line numbers
+def test_transaction_line_range(tmpdir):
+    path = tmpdir.join("log.txt")
+    path.write("".join(f"04 John Doe             {n:05d} 00001.00   \n" for n in range(1, 11)))
+
+    transactions = list(FileIO.iter_transactions(path, chunk_size=50, start_line=3, stop_line=7))
+
+    # Assert that only lines 4 to 7 were parsed
+    assert [t['line_number'] for t in transactions] == [4, 5, 6, 7]
+    assert [t['account_number'] for t in transactions] == ['4', '5', '6', '7']
+
+
+# Test case: session files are merged in sequence order with merged log line numbers
+def test_merge_sessions(tmpdir, capsys):
+    sessions = []
+    merged = []
+    for sequence in range(4):
+        lines = [f"04 John Doe             {sequence * 10 + n:05d} 00001.00   \n" for n in range(1, 4)]
+        if sequence == 2:
+            lines.insert(1, "04 Bad Line\n")
+        lines.append("00 John Doe             00000 00000.00   \n")
+        path = tmpdir.join(f"session_{sequence}.txt")
+        path.write("".join(lines))
+        sessions.append((sequence, path))
+        merged.extend(lines)
+    tmpdir.join("merged.txt").write("".join(merged))
+
+    expected = list(FileIO.iter_transactions(tmpdir.join("merged.txt")))
+    expected_errors = capsys.readouterr().out
+    transactions = list(FileIO.merge_sessions(sessions[::-1], chunk_size=64))
+
+    # Assert that the merge matches reading the concatenated log
+    assert transactions == expected
+    assert capsys.readouterr().out == expected_errors == "ERROR: Fatal error - Line 10: Invalid length (11 chars)\n"
+
+
+# Test case: binary snapshot loads the same accounts as the text master
+@pytest.mark.parametrize("cents", [False, True])
+def test_snapshot_matches_reader(tmpdir, monkeypatch, cents):
+    pytest.importorskip("numpy")
+    master = tmpdir.join("master.txt")
+    master.write("00001 John Doe             A 00010.00 0001 NP\n"
+                 f"00002 {' Spaced Name':<20} D 99999.99 9999 SP\n" +
+                 FileIO.MASTER_TOMBSTONE + "\n"
+                 "00340 Jane Doe             A 00000.05 0000 SP")
+
+    assert FileIO.write_snapshot(master)
+    expected = FileIO.read_old_bank_accounts(master, cents)
+
+    # Assert that both the NumPy and the struct loader match the text reader
+    assert FileIO.read_snapshot(master, cents) == expected
+    assert FileIO.load_old_bank_accounts(master, cents) == expected
+    monkeypatch.setattr("FileIO.numpy", None)
+    assert FileIO.read_snapshot(master, cents) == expected
+
+
+# Test case: snapshots that do not match their master are ignored
+def test_snapshot_invalid(tmpdir, capsys):
+    pytest.importorskip("numpy")
+    master = tmpdir.join("master.txt")
+    master.write("00001 John Doe             A 00010.00 0001 NP\n")
+    snapshot = tmpdir.join("master.txt.snap")
+
+    # Assert that a missing snapshot, changed master, damaged or newer snapshot all fall back to the text
+    assert FileIO.read_snapshot(master) is None
+    FileIO.write_snapshot(master)
+    data = snapshot.read_binary()
+    assert FileIO.read_snapshot(master) is not None
+
+    master.write("00001 John Doe             A 00011.00 0001 NP\n")
+    assert FileIO.read_snapshot(master) is None
+    assert FileIO.load_old_bank_accounts(master)[0]['balance'] == 11.0
+
+    master.write("00001 John Doe             A 00010.00 0001 NP\n")
+    snapshot.write_binary(data[:-1] + b'\x01')
+    assert FileIO.read_snapshot(master) is None
+    snapshot.write_binary(data[:4] + b'\x02' + data[5:])
+    assert FileIO.read_snapshot(master) is None
+
+    # Assert that masters with invalid lines get no snapshot
+    master.write("00001 John Doe             X 00010.00 0001 NP\n")
+    assert not FileIO.write_snapshot(master)
+    assert not snapshot.exists()
+    assert capsys.readouterr().out == ""
+
+
+# Test case: parallel reader matches the sequential reader, aligned or not
+@pytest.mark.parametrize("broken", [None, "04 Bad Line\n", "04 John Doe             00007 00001.00   \r\n"])
+def test_parallel_matches_reader(tmpdir, capsys, broken):
+    lines = [f"{n % 9:02d} John Doe             {n:05d} 00001.{n % 100:02d} {'SP' if n % 5 else 'XX'}\n"
+             for n in range(1, 200)]
+    lines[17] = "0x John Doe             00018 00001.00   \n"
+    lines[120] = "04 John Doe             0012a 00001.00   \n"
+    if broken:
+        lines.insert(150, broken)
+    path = tmpdir.join("log.txt")
+    # Last line has no trailing newline
+    path.write("".join(lines).rstrip("\n"))
+
+    expected = FileIO.read_transactions(path)
+    expected_errors = capsys.readouterr().out
+    transactions = FileIO.read_transactions_parallel(path, processes=3)
+
+    # Assert that transactions and fatal errors match, in order
+    assert transactions == expected
+    assert capsys.readouterr().out == expected_errors
+    assert FileIO.validate_transactions(path, processes=3) == len(expected)
+    assert capsys.readouterr().out == expected_errors
@@ -0,0 +1,71 @@
+import json
+import pytest
+from ErrorSink import ErrorSink
+from Metrics import Metrics
+
+
+class TestMetrics:
+    """
+    Handles all tests related to Metrics
+    """
+
+    def test_inactive_by_default(self, commit):
+        """
+        Nothing is collected outside a Metrics block
+        """
+        with ErrorSink():
+            commit()
+        assert Metrics.active is None
+
+    def test_phases_and_codes(self, commit):
+        """
+        Phases are timed and transactions counted per code
+        """
+        with ErrorSink(), Metrics() as metrics:
+            commit()
+        summary = metrics.summary()
+
+        assert set(summary['phases']) == {'read_master', 'parse_transactions', 'apply', 'write'}
+        assert summary['phases']['read_master']['records'] == 2
+        assert summary['phases']['parse_transactions']['records'] == 6
+        assert summary['phases']['apply']['wall_seconds'] >= summary['phases']['parse_transactions']['wall_seconds']
+        assert {code: totals['count'] for code, totals in summary['transaction_codes'].items()} == \
+               {'01': 2, '04': 3}
+
+    @pytest.mark.parametrize("processes", [None, 2])
+    def test_rejections(self, commit, processes):
+        """
+        Rejections are counted per constraint type, once each, in every mode
+        """
+        with ErrorSink() as sink, Metrics() as metrics:
+            commit(processes)
+
+        assert metrics.rejections == sink.counts
+        assert metrics.rejections[ErrorSink.FATAL] == 1
+        assert sum(metrics.rejections.values()) == 4
+
+    def test_write_json(self, commit, tmpdir):
+        """
+        JSON output holds the summary
+        """
+        with ErrorSink(), Metrics() as metrics:
+            commit()
+        path = tmpdir.join("metrics.json")
+        metrics.write_json(path)
+
+        assert json.loads(path.read())['transaction_codes']['04']['count'] == 3
+
+    def test_write_prometheus(self, commit, tmpdir):
+        """
+        Prometheus output is labelled gauges in the text exposition format
+        """
+        with ErrorSink(), Metrics() as metrics:
+            commit()
+        path = tmpdir.join("metrics.prom")
+        metrics.write_prometheus(path)
+        lines = path.read().splitlines()
+
+        assert "# TYPE bank_phase_wall_seconds gauge" in lines
+        assert 'bank_transactions{code="04"} 3' in lines
+        assert 'bank_rejections{type="Fatal error"} 1' in lines
+        assert any(line.startswith("bank_peak_rss_bytes ") for line in lines)
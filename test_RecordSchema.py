@@ -0,0 +1,73 @@
+import re
+import pytest
+from FileIO import FileIO
+from RecordSchema import Field, RecordSchema
+
+# Small record layout declared only for these tests
+@pytest.fixture
+def schema():
+    return RecordSchema([
+        Field('code', 0, 2, 'count', low=1, high=5, out_of_range="Bad code '{raw}' for {name}"),
+        Field('name', 3, 6, 'text'),
+        Field('amount', 10, 8, 'amount', low=0, high=99999.99),
+        Field('kind', 19, 1, 'choice', values=('X', 'Y')),
+    ], 21)
+
+
+
+class TestRecordSchema:
+    """
+    Handles all tests related to RecordSchema
+    """
+
+    def test_parse(self, schema):
+        """
+        Well formed lines are converted field by field
+        """
+        assert schema.parse("03 Jo     00012.50 Y ") == [3, 'Jo', 12.50, 'Y']
+        assert schema.parse("03 Jo     00012.50 Y ", cents=True) == [3, 'Jo', 1250, 'Y']
+
+    @pytest.mark.parametrize("line, message", [
+        ("03 Jo", "Invalid length (5 chars)"),
+        ("0x Jo     0001x.50 Z ", "Invalid code format"),
+        ("03 Jo     0001x.50 Z ", "Invalid amount format"),
+        ("03 Jo     00012.50 Z ", "Invalid kind 'Z'"),
+        ("07 Jo     00012.50 Y ", "Bad code '07' for Jo    "),
+    ])
+    def test_parse_errors(self, schema, line, message):
+        """
+        The first failing check is reported: length, then formats in field order, then ranges
+        """
+        with pytest.raises(ValueError, match=f"^{re.escape(message)}$"):
+            schema.parse(line)
+
+    def test_format(self, schema):
+        """
+        Records are validated and formatted with space separators
+        """
+        record = {'code': 3, 'name': 'Jo', 'amount': 12.5, 'kind': 'Y'}
+        assert schema.format(record) == "03 Jo     00012.50 Y \n"
+        assert schema.format(dict(record, amount=1250), cents=True) == "03 Jo     00012.50 Y \n"
+
+        with pytest.raises(ValueError, match="^Name exceeds 6 characters: Joanna Doe$"):
+            schema.format(dict(record, name="Joanna Doe"))
+        with pytest.raises(ValueError, match="^Amount out of range: 100000.0$"):
+            schema.format(dict(record, amount=100000.0))
+
+    def test_is_plain(self, schema):
+        """
+        Only lines formatting back to the same text are plain
+        """
+        for line, plain in [("03 Jo     00012.50 Y ", True), ("03  Jo    00012.50 Y ", False),
+                            ("03_Jo     00012.50 Y ", False), ("03 Jo     00012.50 Yx", False)]:
+            assert schema.is_plain(line, schema.parse(line)) == plain
+
+    def test_ranges(self):
+        """
+        A plain master record slices into the current accounts record of the same account
+        """
+        record = "00001 John Doe             A 00010.00 0001 NP\n"
+        current = ''.join(record[start:stop] for start, stop in FileIO.MASTER_RECORD.ranges(FileIO.CURRENT_RECORD))
+
+        assert FileIO.CURRENT_RANGES == [(0, 37), (42, 46)]
+        assert current == "00001 John Doe             A 00010.00 NP\n"
@@ -1,5 +1,9 @@
+import random
 import pytest
 from unittest.mock import patch
+from Account import Account
+from AccountStore import AccountStore
+from Toolbox import Toolbox
 from TransactionHandler import TransactionHandler
 
 # Template account and transactions for future tests
@@ -118,4 +122,150 @@ class TestWithdraw:
                     "Cannot withdraw 10.00 from account 00001"
                 )
                 assert account_template['balance'] == 5.00
-                assert account_template['total_transactions'] == 1
\ No newline at end of file
+                assert account_template['total_transactions'] == 1
+
+
+class TestApply:
+    """
+    Handles all tests related to TransactionHandler.apply() and TransactionHandler.compile()
+    """
+    @pytest.fixture
+    def tc(self): return 4
+
+    def test_compile_runs(self, transaction_template):
+        """
+        End of session records are dropped and same code, same account transactions form runs
+        """
+        end = dict(transaction_template, transaction_code=0)
+        withdraw = dict(transaction_template, transaction_code=1)
+        other = dict(transaction_template, account_number='00002')
+        plan = list(TransactionHandler.compile([transaction_template, transaction_template, end, withdraw, other]))
+
+        assert [len(run) for _, run in plan] == [2, 1, 1]
+        assert plan[1][1] == [withdraw]
+
+    def test_compile_monetary_runs(self, transaction_template):
+        """
+        Consecutive withdraw, transfer, paybill and deposit transactions on one account form a single run
+        """
+        withdraw = dict(transaction_template, transaction_code=1)
+        transfer = dict(transaction_template, transaction_code=2, misc='SD')
+        disable = dict(transaction_template, transaction_code=7)
+        plan = list(TransactionHandler.compile([transaction_template, withdraw, transfer, disable, withdraw, withdraw]))
+
+        assert [len(run) for _, run in plan] == [3, 1, 2]
+        assert plan[0][0] == plan[2][0] == TransactionHandler._monetary_run
+
+    def test_runs_match_sequential(self, capsys):
+        """
+        Batched runs leave the same accounts and errors as applying transactions one by one
+        """
+        rng = random.Random(7)
+        def make_accounts():
+            return [{'account_number': str(n), 'name': 'John Doe', 'status': 'D' if n == 3 else 'A',
+                     'balance': 99900.00 if n == 2 else 50.00, 'total_transactions': 0, 'plan': 'NP'}
+                    for n in range(1, 5)]
+        transactions = [{'transaction_code': rng.choice([0, 1, 3, 4]), 'name': 'John Doe',
+                         'account_number': str(rng.choice([1, 1, 1, 2, 3, 9])),
+                         'amount': round(rng.uniform(0, 60), 2), 'misc': '  '} for _ in range(400)]
+
+        expected = make_accounts()
+        for transaction in transactions:
+            Toolbox.decode_tc(transaction['transaction_code'])(expected, transaction)
+        expected_errors = capsys.readouterr().out
+
+        accounts = make_accounts()
+        TransactionHandler.apply(accounts, transactions)
+
+        assert accounts == expected
+        assert capsys.readouterr().out == expected_errors
+
+    def test_check_names(self, capsys):
+        """
+        Transactions naming someone other than the holder are rejected in log order when names are checked
+        """
+        accounts = AccountStore([Account('1', 'John Doe', 'A', 50.00, 0, 'NP')])
+        transactions = [{'transaction_code': code, 'name': name, 'account_number': number, 'amount': amount,
+                         'misc': misc}
+                        for code, name, number, amount, misc in [
+                            (4, 'john doe', '1', 10.00, '  '),
+                            (4, 'Jane Doe', '1', 10.00, '  '),
+                            (1, 'John Doe', '1', 100.00, '  '),
+                            (4, 'John Doe', '1', 5.00, '  '),
+                            (5, 'Jane Doe', '2', 0.00, 'SP'),
+                            (4, 'Jane Doe', '2', 5.00, '  '),
+                            (4, 'John Doe', '2', 5.00, '  '),
+                            (4, 'John Doe', '9', 5.00, '  '),
+                        ]]
+
+        TransactionHandler.apply(accounts, transactions, check_names=True)
+
+        assert [account['balance'] for account in accounts] == [65.00, 5.00]
+        assert capsys.readouterr().out.splitlines() == [
+            "ERROR: Name Mismatch: Jane Doe is not the holder of account 1",
+            "ERROR: Insufficient Funds: Cannot withdraw 100.00 from account 1",
+            "ERROR: Name Mismatch: John Doe is not the holder of account 2",
+            "ERROR: Account Not Found: Account 9 does not exist",
+        ]
+
+        TransactionHandler.apply(accounts, transactions[1:2])
+        assert accounts.get('1')['balance'] == 75.00
+
+    def test_check_names_after_delete(self, capsys):
+        """
+        A delete run checks each name against the account left by the deletes before it
+        """
+        accounts = AccountStore([Account('1', 'John Doe', 'A', 0.00, 0, 'NP')])
+        transactions = [{'transaction_code': 6, 'name': name, 'account_number': '1', 'amount': 0.00, 'misc': '  '}
+                        for name in ('John Doe', 'Jane Doe')]
+
+        TransactionHandler.apply(accounts, transactions, check_names=True)
+
+        assert len(accounts) == 0
+        assert capsys.readouterr().out.splitlines() == ["ERROR: Account Not Found: Account 1 does not exist"]
+
+    def test_coalesced_runs_match_sequential(self, capsys):
+        """
+        Long monetary runs on one account crossing both balance limits leave the same account and errors
+        as applying transactions one by one
+        """
+        rng = random.Random(11)
+        transactions = [{'transaction_code': code, 'name': 'John Doe', 'account_number': '1',
+                         'amount': round(rng.uniform(0, 400), 2), 'misc': rng.choice(['SD', 'RV', 'RV', 'XX'])}
+                        for codes in ([1, 2, 3, 4, 4, 4], [1, 1, 2, 3, 4]) for code in rng.choices(codes, k=1500)]
+
+        expected = [Account('1', 'John Doe', 'A', 99000.00, 0, 'NP')]
+        for transaction in transactions:
+            Toolbox.decode_tc(transaction['transaction_code'])(expected, transaction)
+        expected_errors = capsys.readouterr().out
+
+        accounts = [Account('1', 'John Doe', 'A', 99000.00, 0, 'NP')]
+        TransactionHandler.apply(accounts, transactions)
+
+        assert "Balance Limit Exceeded" in expected_errors and "Insufficient Funds" in expected_errors
+        assert "Invalid Code" in expected_errors
+        assert accounts == expected
+        assert capsys.readouterr().out == expected_errors
+
+    @pytest.mark.parametrize("processes", [1, 2])
+    def test_parallel_matches_apply(self, capsys, processes):
+        """
+        Sharded application leaves the same accounts and reports errors in log order
+        """
+        rng = random.Random(5)
+        transactions = [{'transaction_code': rng.choice([1, 2, 3, 4, 4]), 'name': 'John Doe',
+                         'account_number': str(rng.choice([1, 1, 1, 2, 5, 7, 9])),
+                         'amount': round(rng.uniform(0, 400), 2), 'misc': rng.choice(['SD', 'RV'])}
+                        for _ in range(2000)]
+        def make_accounts():
+            return [Account(str(number), 'John Doe', 'D' if number == 5 else 'A', 99000.00, 0, 'NP')
+                    for number in range(1, 9)]
+
+        expected = AccountStore(make_accounts())
+        TransactionHandler.apply(expected, transactions)
+        expected_errors = capsys.readouterr().out
+
+        accounts = TransactionHandler.apply_parallel(make_accounts(), transactions, processes)
+
+        assert list(accounts) == list(expected)
+        assert capsys.readouterr().out == expected_errors